@@ -1,26 +1,420 @@
-from flask import Flask, request, jsonify
-from pymongo import MongoClient
+from flask import Flask, Blueprint, current_app, g, has_request_context, request, jsonify, send_from_directory, Response, stream_with_context
+from pymongo import MongoClient, IndexModel, ASCENDING, DESCENDING, GEOSPHERE, TEXT, CursorType, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne, WriteConcern
+from pymongo import monitoring
+from pymongo.errors import CollectionInvalid, DuplicateKeyError, OperationFailure, PyMongoError
 from bson import ObjectId
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
 import datetime
 from functools import wraps
 from flask_cors import CORS
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import base64
+import click
+import copy
+import csv
+import hashlib
+import io
+import json
+import logging
+import math
+import multiprocessing
+import os
+import secrets
+import shutil
+import socket
+import tempfile
+import threading
+import time
+
+try:
+    import redis # Optional: only needed for VEHICLE_CACHE_BACKEND=redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__) # For threads without an app context; same logger as app.logger
 
 # --- App and DB Configuration ---
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'your-very-secret-key' 
-CORS(app)
+DEFAULT_CONFIG = {
+    'SECRET_KEY': '', # Signs every access token; create_app refuses to start without one outside debug and testing
+    # Seconds an authenticated user stays cached. Writes invalidate the cache of the worker that made them only,
+    # so other workers may act on the old user document for up to this long
+    'USER_CACHE_TTL': 60,
+    'USER_CACHE_MAXSIZE': 1024,
+    'STREAM_BATCH_SIZE': 100, # Documents pulled from Mongo per getMore when streaming lists
+    'PAGE_DEFAULT_LIMIT': 20, # Used when a client sends `after` without `limit`
+    'PAGE_MAX_LIMIT': 100,
+    'NEARBY_DEFAULT_RADIUS_KM': 25,
+    'NEARBY_MAX_RADIUS_KM': 200,
+    'AVAILABILITY_MAX_VEHICLES': 100, # Vehicle IDs accepted per /vehicles/availability call
+    'SEARCH_PRICE_BUCKETS': [0, 500, 1000, 2000, 5000], # Lower bounds of the rent_price facet buckets
+    'FACET_CACHE_TTL': 60, # Seconds facet counts are reused; vehicle writes in this process clear them sooner
+    'FACET_CACHE_MAXSIZE': 256,
+    'VEHICLE_CACHE_BACKEND': 'memory', # 'memory' (per worker process) or 'redis' (shared by all workers)
+    'VEHICLE_CACHE_URL': 'redis://localhost:6379/0',
+    'VEHICLE_CACHE_TTL': 30, # Seconds a cached vehicle or listing page lives; also bounds staleness across memory caches
+    'VEHICLE_CACHE_MAXSIZE': 4096,
+    'VEHICLE_CACHE_LOCK_WAIT': 2, # Seconds a reader waits for another request to fill a missing entry
+    'SYNC_CLOCK_SKEW': 5, # Seconds a ?since= token is moved back to cover in-flight writes
+    'TOMBSTONE_TTL_DAYS': 30, # Clients whose `since` is older than this must refetch in full
+    # Werkzeug hash method for new passwords; stored hashes using anything else are upgraded on login
+    'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:600000',
+    'PASSWORD_HASH_WORKERS': 2, # Processes in each web worker's hashing pool; size workers x this against the CPUs
+    'PASSWORD_HASH_QUEUE': 32, # Hash jobs allowed in flight before new ones are refused
+    'PASSWORD_HASH_WAIT': 2, # Seconds a request waits for a queue slot before getting a 503
+    'TELEMETRY_MAX_POINTS': 5000, # Positions accepted per ingest call
+    'TELEMETRY_TTL_DAYS': 90, # Raw positions expire after this
+    'TELEMETRY_MAX_FUTURE_SECONDS': 300, # Device clocks may run ahead by this much
+    'TRACK_MAX_POINTS': 500, # Upper bound on points a track query returns
+    'TRACK_MAX_HOURS': 168, # Widest window a track query may cover
+    'EVENTS_LOG_BYTES': 64 * 1024 * 1024, # Size of the capped event log; bounds how far back a client can resume
+    'EVENTS_REPLAY_LIMIT': 500, # Missed events replayed on reconnect before the client is told to refetch
+    'EVENTS_BUFFER': 256, # Events queued per open stream before it is told to refetch
+    'EVENTS_HEARTBEAT': 15, # Seconds between keep-alive comments on idle /events streams
+    'EVENTS_POLL_INTERVAL': 1, # Seconds between event log reads when it cannot be tailed
+    # How far out of seq order events may land in the log (publish latency plus clock skew);
+    # replays and the hub look back this far and skip what they already sent
+    'EVENTS_LOOKBACK_SECONDS': 10,
+    # Open /events streams per worker process. Each one holds a thread of a gthread worker for as long
+    # as the app is open, so keep this below GUNICORN_THREADS there; the gevent pool raises it
+    'EVENTS_MAX_STREAMS': 2,
+    # Vehicle image uploads: 'local' files served from /images, or 's3'
+    'IMAGE_STORAGE': 'local',
+    'IMAGE_LOCAL_DIR': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'),
+    'IMAGE_BASE_URL': '/images', # Public URL prefix of stored images (a CDN in front of the bucket for s3)
+    'IMAGE_S3_BUCKET': '',
+    'IMAGE_S3_PREFIX': 'vehicles/',
+    'IMAGE_MAX_BYTES': 15 * 1024 * 1024,
+    'IMAGE_THUMB_SIZE': 160, # Longest edge in px of the thumbnail variant
+    'IMAGE_LIST_SIZE': 640, # Longest edge in px of the variant list and detail responses use
+    'IMAGE_WORKERS': 2, # Processes rendering variants
+    'BULK_MAX_ROWS': 10000, # Vehicles accepted per POST /vehicles/bulk
+    'BULK_CHUNK_SIZE': 500, # Documents per insert_many / bulk_write round trip
+    'BULK_STATUS_MAX_ITEMS': 500, # Bookings per POST /bookings/bulk-status
+    # Booking lifecycle sweep: run `flask booking-sweep --loop` as a worker, or set SCHEDULER_ENABLED
+    # to run it on a thread in every web worker (a lease lets one of them sweep at a time)
+    'SCHEDULER_ENABLED': False,
+    'SCHEDULER_INTERVAL': 300, # Seconds between sweeps
+    'SCHEDULER_BATCH_SIZE': 500, # Bookings or vehicles per bulk_write
+    'BOOKING_PENDING_TTL_HOURS': 72, # Unanswered requests are cancelled after this, or once their start time passes
+    'BOOKING_COMPLETE_GRACE_MINUTES': 60, # Confirmed bookings are completed this long after they end
+    'BOOKING_ARCHIVE_AFTER_DAYS': 180, # Completed/cancelled bookings that ended this long ago move to bookings_archive
+    'ENSURE_INDEXES_ON_STARTUP': True,
+    'SLOW_REQUEST_MS': 500, # Requests slower than this are logged with the Mongo commands they ran (0 = off)
+    # MongoClient settings, one client per worker process
+    'MONGO_URI': 'mongodb://localhost:27017/',
+    'MONGO_DB': 'agri_rental',
+    'MONGO_MAX_POOL_SIZE': 50, # Connections per worker process; size workers x this against the server limit
+    'MONGO_MIN_POOL_SIZE': 0,
+    'MONGO_MAX_IDLE_TIME_MS': 60000,
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': 2000, # Fail fast instead of queueing forever when the pool is exhausted
+    'MONGO_CONNECT_TIMEOUT_MS': 5000,
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': 5000,
+    'MONGO_SOCKET_TIMEOUT_MS': 20000,
+    'MONGO_READ_PREFERENCE': 'primary',
+    'MONGO_WRITE_CONCERN': 'majority', # w value: 'majority' or a number of nodes
+    'MONGO_JOURNAL': True,
+}
 
-try:
-    client = MongoClient('mongodb://localhost:27017/')
-    db = client.agri_rental 
-    users_collection = db.users
-    vehicles_collection = db.vehicles
-    bookings_collection = db.bookings
-    print("MongoDB connected successfully!")
-except Exception as e:
-    print(f"Error connecting to MongoDB: {e}")
+def config_from_env(environ=None):
+    """Read any DEFAULT_CONFIG key from the environment, cast to the default's type (lists item by item)."""
+    environ = os.environ if environ is None else environ
+    config = {}
+    for key, default in DEFAULT_CONFIG.items():
+        if key not in environ:
+            continue
+        value = environ[key]
+        if isinstance(default, bool):
+            config[key] = value.lower() in ('1', 'true', 'yes', 'on')
+        elif isinstance(default, (int, float)):
+            config[key] = type(default)(value)
+        elif default is None:
+            config[key] = int(value) if value else None
+        elif isinstance(default, list): # Comma separated, e.g. SEARCH_PRICE_BUCKETS=0,1000,5000
+            cast = type(default[0]) if default else str
+            config[key] = [cast(item.strip()) for item in value.split(',') if item.strip()]
+        else:
+            config[key] = value
+    return config
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """
+    Connection pool listener that measures how long requests wait to check out
+    a connection, so workers can be sized against Mongo's connection limit.
+    Events fire on the thread doing the checkout, so a thread-local pairs them up.
+    """
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.checked_out = 0
+            self.connections = 0
+
+    def _waited(self):
+        started = getattr(self._local, 'started', None)
+        self._local.started = None
+        return time.perf_counter() - started if started is not None else 0.0
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        pool_checkouts.inc()
+        pool_checked_out.inc()
+        pool_checkout_wait_max.set(self.wait_max)
+
+    def connection_check_out_failed(self, event):
+        waited = self._waited()
+        with self._lock:
+            self.checkout_failures += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+        pool_checkout_failures.inc()
+        pool_checkout_wait_max.set(self.wait_max)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+        pool_checked_out.dec()
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections -= 1
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'checked_out': self.checked_out,
+                'open_connections': self.connections
+            }
+
+pool_stats = PoolStats()
+
+# --- Metrics ---
+
+# prometheus_client metrics. Under gunicorn, PROMETHEUS_MULTIPROC_DIR (see gunicorn.conf.py) has every
+# worker write its samples to files in a shared directory, and /metrics adds them up across the pool.
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Time spent serving a request, including streamed bodies.',
+    ['route', 'method', 'status'], buckets=LATENCY_BUCKETS)
+command_duration = Histogram(
+    'mongo_command_duration_seconds', 'Mongo command round trips, attributed to the Flask route that issued them.',
+    ['route', 'collection', 'command'], buckets=LATENCY_BUCKETS)
+commands_per_request = Histogram(
+    'mongo_commands_per_request', 'Mongo commands issued while serving one request.',
+    ['route', 'method'], buckets=[0, 1, 2, 3, 4, 5, 8, 13, 21, 34])
+pool_checkouts = Counter('mongo_pool_checkouts', 'Connections checked out of the Mongo pool.')
+pool_checkout_failures = Counter('mongo_pool_checkout_failures', 'Checkouts that timed out or failed.')
+pool_checkout_wait_max = Gauge(
+    'mongo_pool_checkout_wait_max_seconds', 'Longest wait for a pooled connection.', multiprocess_mode='max')
+# Gauges of exited workers are dropped by gunicorn.conf.py's child_exit; counters keep counting them
+pool_checked_out = Gauge('mongo_pool_checked_out', 'Pooled connections in use.', multiprocess_mode='livesum')
+events_open_streams = Gauge('events_open_streams', 'Open GET /events streams.', multiprocess_mode='livesum')
+user_cache_hits = Counter('user_cache_hits', 'Authenticated requests served from user_cache.')
+user_cache_misses = Counter('user_cache_misses', 'Authenticated requests that loaded the user from Mongo.')
+
+def current_route():
+    """Route template of the current request, e.g. /vehicles/<vehicle_id>."""
+    if not has_request_context():
+        return 'background'
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Attributes every Mongo command to the Flask request running on the same thread
+    (command events fire on the thread that issued the operation).
+    """
+    def __init__(self):
+        self._local = threading.local()
+
+    def started(self, event):
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            pending = self._local.pending = {}
+        # getMore names the cursor id first and the collection separately
+        collection = event.command.get('collection' if event.command_name == 'getMore' else event.command_name)
+        pending[event.request_id] = collection if isinstance(collection, str) else ''
+
+    def _finished(self, event, failed):
+        pending = getattr(self._local, 'pending', {})
+        collection = pending.pop(event.request_id, '')
+        seconds = event.duration_micros / 1e6
+        command_duration.labels(current_route(), collection, event.command_name).observe(seconds)
+        if has_request_context() and 'mongo_commands' in g:
+            g.mongo_commands.append((event.command_name, collection, round(seconds * 1000, 2), failed))
+
+    def succeeded(self, event):
+        self._finished(event, False)
+
+    def failed(self, event):
+        self._finished(event, True)
+
+command_metrics = CommandMetrics()
+
+def render_metrics():
+    """Prometheus text exposition, summed over every worker when PROMETHEUS_MULTIPROC_DIR is set."""
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        return generate_latest(REGISTRY) # A single process, e.g. the development server
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+class MongoConnection:
+    """
+    Holds the MongoClient of one app in the current process. The client is created on
+    first use and again after a fork, so pre-fork WSGI workers never share sockets.
+    """
+    def __init__(self, config):
+        self.config = {k: config[k] for k in DEFAULT_CONFIG if k.startswith('MONGO_')}
+        self.transactions_supported = None # Learned from the server on first use
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self._client = self._create_client()
+                    self._pid = os.getpid()
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self.config['MONGO_DB']]
+
+    def supports_transactions(self):
+        """Multi-document transactions need a replica set or mongos; a standalone mongod has neither."""
+        if self.transactions_supported is None:
+            try:
+                hello = self.client.admin.command('hello')
+                self.transactions_supported = 'setName' in hello or hello.get('msg') == 'isdbgrid'
+            except Exception:
+                self.transactions_supported = False
+        return self.transactions_supported
+
+    def _create_client(self):
+        config = self.config
+        w = config['MONGO_WRITE_CONCERN']
+        return MongoClient(
+            config['MONGO_URI'],
+            maxPoolSize=config['MONGO_MAX_POOL_SIZE'],
+            minPoolSize=config['MONGO_MIN_POOL_SIZE'],
+            maxIdleTimeMS=config['MONGO_MAX_IDLE_TIME_MS'],
+            waitQueueTimeoutMS=config['MONGO_WAIT_QUEUE_TIMEOUT_MS'],
+            connectTimeoutMS=config['MONGO_CONNECT_TIMEOUT_MS'],
+            serverSelectionTimeoutMS=config['MONGO_SERVER_SELECTION_TIMEOUT_MS'],
+            socketTimeoutMS=config['MONGO_SOCKET_TIMEOUT_MS'],
+            readPreference=config['MONGO_READ_PREFERENCE'],
+            w=int(w) if str(w).isdigit() else w,
+            journal=config['MONGO_JOURNAL'],
+            event_listeners=[pool_stats, command_metrics],
+            connect=False # Nothing touches the network until the first operation
+        )
+
+class AppLocal:
+    """
+    Proxy to one of the current app's services in app.extensions['agri_rental'] (see
+    create_app), so two apps in one process never share a connection or a cache.
+    """
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(current_app.extensions['agri_rental'][self.name], attr)
+
+mongo = AppLocal('mongo')
+
+class LazyCollection:
+    """Collection handle resolved through `mongo` on every use, so it always belongs to this process's client."""
+    def __init__(self, name):
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(mongo.db[self.name], attr)
+
+users_collection = LazyCollection('users')
+vehicles_collection = LazyCollection('vehicles')
+bookings_collection = LazyCollection('bookings')
+owner_stats_collection = LazyCollection('owner_stats')
+tombstones_collection = LazyCollection('tombstones')
+telemetry_collection = LazyCollection('telemetry') # Time-series collection, see collection_registry
+events_collection = LazyCollection('events') # Capped change log behind GET /events
+counters_collection = LazyCollection('counters')
+bookings_archive_collection = LazyCollection('bookings_archive') # Old finished bookings moved out by the booking sweep
+scheduler_collection = LazyCollection('scheduler') # Leases and last reports of background jobs
+
+bp = Blueprint('api', __name__, cli_group=None)
+
+# --- Request Instrumentation ---
+
+@bp.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.mongo_commands = []
+
+@bp.after_app_request
+def remember_status(response):
+    g.status_code = response.status_code
+    return response
+
+@bp.teardown_app_request
+def record_request_metrics(exc):
+    """
+    Runs once the response is fully sent (streamed bodies included), so the
+    timing and command list cover the whole request.
+    """
+    if 'request_started' not in g:
+        return
+    seconds = time.perf_counter() - g.request_started
+    route = current_route()
+    status = g.get('status_code', 500)
+    commands = g.mongo_commands
+    request_duration.labels(route, request.method, status).observe(seconds)
+    commands_per_request.labels(route, request.method).observe(len(commands))
+
+    slow_ms = current_app.config['SLOW_REQUEST_MS']
+    if slow_ms and seconds * 1000 >= slow_ms:
+        current_app.logger.warning(
+            'Slow request %s %s (%s) took %.1f ms with %d Mongo commands: %s',
+            request.method, request.path, route, seconds * 1000, len(commands),
+            ', '.join(f"{name}({collection}) {ms}ms{' FAILED' if failed else ''}" for name, collection, ms, failed in commands)
+        )
 
 def to_json(data):
     if isinstance(data, list):
@@ -49,6 +443,890 @@ def to_json(data):
         return result
     return data
 
+def stream_json(cursor, headers=None):
+    """
+    Stream a cursor as a JSON array. Each document is converted and serialized
+    on its own, so memory stays flat no matter how many results there are.
+    """
+    def generate():
+        yield '['
+        first = True
+        for doc in cursor:
+            if not first:
+                yield ','
+            first = False
+            yield json.dumps(to_json(doc))
+        yield ']'
+    return Response(stream_with_context(generate()), mimetype='application/json', headers=headers)
+
+# --- Pagination Helpers ---
+
+# List endpoints are ordered newest first; the keyset is (created_at, _id).
+PAGE_SORT = [('created_at', -1), ('_id', -1)]
+
+def pack_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+def unpack_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+def encode_cursor(doc):
+    """Build an opaque cursor pointing just after `doc`."""
+    return pack_cursor({'c': doc['created_at'].isoformat(), 'i': str(doc['_id'])})
+
+def decode_cursor(cursor):
+    """Turn an opaque cursor back into a keyset filter. Raises ValueError if it is malformed."""
+    try:
+        key = unpack_cursor(cursor)
+        created_at = datetime.datetime.fromisoformat(key['c'])
+        last_id = ObjectId(key['i'])
+    except Exception:
+        raise ValueError('Invalid pagination cursor')
+    return {'$or': [
+        {'created_at': {'$lt': created_at}},
+        {'created_at': created_at, '_id': {'$lt': last_id}}
+    ]}
+
+def parse_list_args(allowed_fields):
+    """
+    Read `limit`, `after` and `fields` (limited to `allowed_fields`) from the query string.
+    Returns (limit, keyset_filter, projection); limit is None when the client did not ask for a page.
+    """
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    fields = request.args.get('fields')
+
+    if limit is not None:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        limit = min(limit, current_app.config['PAGE_MAX_LIMIT'])
+    elif after:
+        limit = current_app.config['PAGE_DEFAULT_LIMIT']
+
+    keyset_filter = decode_cursor(after) if after else None
+    return limit, keyset_filter, parse_fields(fields, allowed_fields)
+
+# What a ?fields= sparse fieldset may name in each list, besides dotted paths into these
+VEHICLE_LIST_FIELDS = {
+    '_id', 'owner_id', 'vehicle_name', 'model', 'type', 'rent_price', 'availability', 'location',
+    'image1_url', 'image2_url', 'image1_thumb_url', 'image2_thumb_url', 'images', 'last_position',
+    'created_at', 'updated_at'
+}
+BOOKING_LIST_FIELDS = {
+    '_id', 'renter_id', 'owner_id', 'vehicle_id', 'vehicle_details', 'renter_details',
+    'start_time', 'end_time', 'status', 'amount', 'created_at', 'updated_at'
+}
+
+def parse_fields(fields, allowed_fields):
+    """
+    Turn a comma separated ?fields= value into an inclusion projection, or None.
+    Raises ValueError for fields outside `allowed_fields`.
+    """
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = sorted({name for name in names if name.split('.')[0] not in allowed_fields})
+    if unknown:
+        raise ValueError(f"Unknown field(s) in fields: {', '.join(unknown)}")
+    projection = {name: 1 for name in names}
+    projection['created_at'] = 1 # Needed to build the next cursor
+    return projection
+
+def page_response(cursor, limit, cursor_for=encode_cursor):
+    """
+    Stream a list response, or send one page when paginating. The cursor must then
+    have been limited to limit + 1 documents so we can tell whether another page
+    exists. A page is small enough to serialize whole, so its ETag comes from the
+    body and a conditional request costs no extra query.
+    """
+    if not limit:
+        return stream_json(cursor)
+    docs = list(cursor)
+    response = Response(mimetype='application/json')
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers['X-Next-Cursor'] = cursor_for(docs[-1])
+    response.set_data(json.dumps(to_json(docs)))
+    response.add_etag()
+    return response.make_conditional(request)
+
+# --- Delta Sync Helpers ---
+
+def parse_since():
+    """Read ?since= as a naive UTC datetime, or None. Raises ValueError if it is malformed."""
+    since = request.args.get('since')
+    if not since:
+        return None
+    try:
+        return parse_timestamp(since) # Clients often send toISOString() output, e.g. ...Z
+    except (ValueError, OverflowError):
+        raise ValueError('since must be an ISO timestamp')
+
+def record_tombstone(collection_name, doc_id, **audience):
+    """
+    Remember a deleted document so ?since= clients can drop it.
+    `audience` holds the owner_id/renter_id used to scope tombstones per user.
+    """
+    tombstones_collection.insert_one({
+        'collection': collection_name,
+        'doc_id': doc_id,
+        'deleted_at': datetime.datetime.utcnow(),
+        **audience
+    })
+
+def record_tombstones(collection_name, docs, audience_fields):
+    """record_tombstone for a batch of removed documents, scoped by their own `audience_fields`."""
+    now = datetime.datetime.utcnow()
+    tombstones_collection.insert_many([
+        {'collection': collection_name, 'doc_id': doc['_id'], 'deleted_at': now,
+         **{field: doc.get(field) for field in audience_fields}}
+        for doc in docs
+    ])
+
+def changed_since(query, since):
+    return {'$and': [query, {'updated_at': {'$gt': since}}]}
+
+def delta_response(changed, since, tombstone_filter, visible=None):
+    """
+    Changes to a list since `since`: the `changed` documents (written after it)
+    and the IDs of ones deleted, or per `visible` no longer part of the list.
+    The returned `since` is what the client sends next time.
+    """
+    sync_time = datetime.datetime.utcnow() - datetime.timedelta(seconds=current_app.config['SYNC_CLOCK_SKEW'])
+    if since < datetime.datetime.utcnow() - datetime.timedelta(days=current_app.config['TOMBSTONE_TTL_DAYS']):
+        return jsonify({'message': 'since is too old, refetch the full list'}), 410
+
+    items, deleted = [], []
+    for doc in changed:
+        if visible is None or visible(doc):
+            items.append(doc)
+        else:
+            deleted.append(str(doc['_id']))
+    for tombstone in tombstones_collection.find({**tombstone_filter, 'deleted_at': {'$gt': since}}, {'doc_id': 1}):
+        deleted.append(str(tombstone['doc_id']))
+    return jsonify({'items': to_json(items), 'deleted': deleted, 'since': sync_time.isoformat()})
+
+def list_stats(collection, query):
+    """[count, newest updated_at] of the documents matching query."""
+    stats = next(collection.aggregate([
+        {'$match': query},
+        {'$group': {'_id': None, 'count': {'$sum': 1}, 'last': {'$max': '$updated_at'}}}
+    ]), {})
+    return [stats.get('count', 0), stats['last'].isoformat() if stats.get('last') else None]
+
+def list_etag(collection, query, current_user, joined=None):
+    """
+    ETag for a list without reading it: every write bumps updated_at and every
+    delete changes the count, so (count, newest updated_at) identifies the content.
+    `joined` is a (collection, query) pair for documents merged into the items at
+    read time; their writes change the list as well.
+    """
+    key = [current_user['_id'], current_user.get('role'), request.path, request.query_string.decode(),
+           *list_stats(collection, query), *(list_stats(*joined) if joined else [])]
+    return hashlib.md5(json.dumps(key).encode()).hexdigest()
+
+def not_modified(etag):
+    response = Response(status=304)
+    response.set_etag(etag)
+    return response
+
+# --- Change Events ---
+
+def event_audience(owner_id=None, renter_id=None, renters=False):
+    """Audience keys an event is delivered to: single users and/or every renter."""
+    audience = [f'user:{user_id}' for user_id in (owner_id, renter_id) if user_id]
+    if renters:
+        audience.append('renters')
+    return audience
+
+def subscriber_keys(current_user):
+    keys = [f"user:{current_user['_id']}"]
+    if current_user.get('role') == 'renter':
+        keys.append('renters')
+    return keys
+
+def publish_event(event_type, doc_id, audience, **data):
+    """
+    Append a compact change event to the shared event log. Every worker tails the
+    log and pushes the event to its open /events streams. Events are a hint to
+    refetch, so a failed publish is logged instead of failing the write it describes.
+    """
+    publish_events([(event_type, doc_id, audience, data)])
+
+def publish_events(events):
+    """Publish several (type, doc_id, audience, data) events with one seq reservation and one insert."""
+    if not events:
+        return
+    try:
+        last_seq = counters_collection.find_one_and_update(
+            {'_id': 'events'}, {'$inc': {'seq': len(events)}}, upsert=True, return_document=ReturnDocument.AFTER
+        )['seq']
+        now = datetime.datetime.utcnow()
+        events_collection.insert_many([{
+            'seq': last_seq - len(events) + i + 1,
+            'type': event_type,
+            'id': str(doc_id),
+            'data': data,
+            'audience': audience,
+            'created_at': now
+        } for i, (event_type, doc_id, audience, data) in enumerate(events)])
+    except PyMongoError as e:
+        current_app.logger.warning('Could not publish %d event(s) starting with %s: %s', len(events), events[0][0], e)
+
+def format_event(event):
+    """One SSE frame; the seq doubles as the resume token (Last-Event-ID)."""
+    payload = json.dumps({'id': event['id'], **to_json(event.get('data', {})), 'at': event['created_at'].isoformat()})
+    return f"id: {event['seq']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+class EventSubscriber:
+    """One open /events stream: a bounded queue filled by the hub thread."""
+    def __init__(self, keys, maxsize):
+        self.keys = keys
+        self.maxsize = maxsize
+        self.queue = deque()
+        self.overflowed = False
+        self.closed = False
+        self.ready = threading.Event()
+
+    def push(self, event):
+        if len(self.queue) >= self.maxsize:
+            self.overflowed = True # A stalled client; it gets a reset instead of an unbounded backlog
+        else:
+            self.queue.append(event)
+        self.ready.set()
+
+    def wait(self, timeout):
+        """Return the queued events, waiting up to `timeout` seconds for the first one."""
+        self.ready.wait(timeout)
+        self.ready.clear()
+        events = []
+        while self.queue:
+            events.append(self.queue.popleft())
+        return events
+
+class EventHub:
+    """
+    Fans the event log out to this process's open streams. A single thread per
+    process tails the capped `events` collection; idle streams only cost a queue
+    and a threading.Event, never a Mongo query.
+    """
+    def __init__(self, config):
+        self._subscribers = {} # audience key -> set of EventSubscriber
+        self._streams = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self.poll_interval = config['EVENTS_POLL_INTERVAL']
+        self.lookback = datetime.timedelta(seconds=config['EVENTS_LOOKBACK_SECONDS'])
+
+    def subscribe(self, keys, maxsize, max_streams):
+        """Register a stream, or return None when this process already holds max_streams."""
+        subscriber = EventSubscriber(keys, maxsize)
+        with self._lock:
+            if self._pid != os.getpid(): # First stream in this process (or after a fork)
+                self._subscribers = {}
+                self._streams = 0
+                self._pid = os.getpid()
+                events_open_streams.set(0)
+                app = current_app._get_current_object()
+                threading.Thread(target=self._tail, args=(app,), name='event-hub', daemon=True).start()
+            if self._streams >= max_streams:
+                return None
+            self._streams += 1
+            events_open_streams.inc()
+            for key in keys:
+                self._subscribers.setdefault(key, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber.closed:
+                return
+            subscriber.closed = True
+            self._streams -= 1
+            events_open_streams.dec()
+            for key in subscriber.keys:
+                self._subscribers.get(key, set()).discard(subscriber)
+
+    def connections(self):
+        with self._lock:
+            return self._streams if self._pid == os.getpid() else 0
+
+    def dispatch(self, event):
+        with self._lock:
+            targets = set()
+            for key in event.get('audience', []):
+                targets |= self._subscribers.get(key, set())
+        for subscriber in targets:
+            subscriber.push(event)
+
+    def _tail(self, app):
+        """
+        Dispatch every event appended to the log. A seq is reserved before its event is
+        inserted, so concurrent publishers can land out of seq order; reads therefore
+        go by created_at with a lookback, skipping events already dispatched.
+        """
+        with app.app_context(): # The hub thread reads through this app's connection
+            newest, seen, tailable = None, {}, True # seen: seq -> created_at of recently dispatched events
+            while True:
+                try:
+                    if newest is None: # Only events published from now on; older ones are replayed per stream
+                        newest = datetime.datetime.utcnow()
+                        recent = events_collection.find({'created_at': {'$gte': newest - self.lookback}}, {'seq': 1, 'created_at': 1})
+                        seen = {event['seq']: event['created_at'] for event in recent}
+                    query = {'created_at': {'$gte': newest - self.lookback}}
+                    if tailable:
+                        cursor = events_collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                    else:
+                        cursor = events_collection.find(query).sort('seq', ASCENDING)
+                    while cursor.alive: # A tailable cursor stays open and waits server-side for new events
+                        for event in cursor:
+                            if event['seq'] in seen:
+                                continue
+                            seen[event['seq']] = event['created_at']
+                            newest = max(newest, event['created_at'])
+                            self.dispatch(event)
+                        horizon = newest - 2 * self.lookback
+                        seen = {seq: created_at for seq, created_at in seen.items() if created_at >= horizon}
+                except OperationFailure as e:
+                    if tailable and 'capped' in str(e).lower():
+                        tailable = False # Not capped (ensure-indexes has not run): poll instead
+                    else:
+                        logger.warning('Event hub could not read the event log: %s', e)
+                except PyMongoError as e:
+                    logger.warning('Event hub lost the event log: %s', e)
+                time.sleep(self.poll_interval)
+
+event_hub = AppLocal('event_hub')
+
+# --- Search Helpers ---
+
+# ?sort= options of /vehicles/search; each ends on _id so the keyset is unique
+SEARCH_SORTS = {
+    'newest': [('created_at', DESCENDING), ('_id', DESCENDING)],
+    'price_asc': [('rent_price', ASCENDING), ('_id', ASCENDING)],
+    'price_desc': [('rent_price', DESCENDING), ('_id', DESCENDING)],
+}
+
+def search_cursor_for(sort):
+    """Cursor builder for a SEARCH_SORTS entry: the sort key and _id of the last row."""
+    field = sort[0][0]
+    def encode(doc):
+        value = doc[field]
+        return pack_cursor({'v': value.isoformat() if isinstance(value, datetime.datetime) else value, 'i': str(doc['_id'])})
+    return encode
+
+def decode_search_cursor(cursor, sort):
+    """Keyset filter continuing after a search_cursor_for cursor. Raises ValueError if it is malformed."""
+    (field, direction), _ = sort
+    try:
+        key = unpack_cursor(cursor)
+        value = datetime.datetime.fromisoformat(key['v']) if field == 'created_at' else float(key['v'])
+        last_id = ObjectId(key['i'])
+    except Exception:
+        raise ValueError('Invalid pagination cursor')
+    op = '$gt' if direction == ASCENDING else '$lt'
+    return {'$or': [{field: {op: value}}, {field: value, '_id': {op: last_id}}]}
+
+def search_facets(match, type_filter, price_filter):
+    """
+    Facet counts for a search in one aggregation. Each facet ignores its own filter,
+    so the client can show how many results picking another type or price range gives.
+    """
+    boundaries = current_app.config['SEARCH_PRICE_BUCKETS']
+    facets = next(vehicles_collection.aggregate([
+        {'$match': match},
+        {'$facet': {
+            'types': [
+                {'$match': price_filter},
+                {'$group': {'_id': '$type', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1, '_id': 1}}
+            ],
+            'prices': [
+                {'$match': type_filter},
+                {'$bucket': {
+                    'groupBy': '$rent_price',
+                    'boundaries': boundaries + [float('inf')],
+                    'default': 'other', # Missing or negative prices
+                    'output': {'count': {'$sum': 1}}
+                }}
+            ]
+        }}
+    ]), {'types': [], 'prices': []})
+    upper = dict(zip(boundaries, boundaries[1:]))
+    return {
+        'type': [{'value': group['_id'], 'count': group['count']} for group in facets['types']],
+        'price': [{'min': group['_id'], 'max': upper.get(group['_id']), 'count': group['count']}
+                  for group in facets['prices'] if group['_id'] != 'other']
+    }
+
+# --- Geospatial Helpers ---
+
+def location_to_geojson(location):
+    """
+    Normalize a vehicle `location` to a GeoJSON Point for the 2dsphere index.
+    Accepts {latitude, longitude}, {lat, lng} or an existing Point.
+    Returns None when the location carries no usable coordinates (e.g. a free-text address).
+    """
+    if not isinstance(location, dict):
+        return None
+    try:
+        if location.get('type') == 'Point':
+            lng, lat = (float(c) for c in location['coordinates'])
+        else:
+            lat = float(location.get('latitude', location.get('lat')))
+            lng = float(location.get('longitude', location.get('lng', location.get('lon'))))
+    except (TypeError, ValueError, KeyError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return {'type': 'Point', 'coordinates': [lng, lat]}
+
+def encode_distance_cursor(doc):
+    """Cursor for distance-ordered results; the keyset is (distance, _id)."""
+    return pack_cursor({'d': doc['distance'], 'i': str(doc['_id'])})
+
+def decode_distance_cursor(cursor):
+    """Returns (min_distance_m, last_id). Raises ValueError if the cursor is malformed."""
+    try:
+        key = unpack_cursor(cursor)
+        return float(key['d']), ObjectId(key['i'])
+    except Exception:
+        raise ValueError('Invalid pagination cursor')
+
+# --- Availability Helpers ---
+
+# Booking statuses that hold a vehicle for their time window
+BLOCKING_STATUSES = ['pending', 'confirmed']
+
+def merge_intervals(intervals):
+    """Merge (start, end) pairs sorted by start into non-overlapping intervals."""
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def free_intervals(busy, window_start, window_end):
+    """Gaps between merged busy intervals inside the window."""
+    free = []
+    cursor = window_start
+    for start, end in busy:
+        if start > cursor:
+            free.append([cursor, start])
+        cursor = max(cursor, end)
+    if cursor < window_end:
+        free.append([cursor, window_end])
+    return free
+
+# --- In-process Caches ---
+
+class TTLCache:
+    """
+    Small thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    Keeps hit/miss/eviction counters so we can see how well it works.
+    """
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict() # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False) # Drop the least recently used entry
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+# Authenticated users keyed by the user_id carried in the decoded token.
+user_cache = AppLocal('user_cache')
+
+# Search facet counts keyed by the search scope and filters; cleared on vehicle writes.
+facet_cache = AppLocal('facet_cache')
+
+# --- Vehicle Read Cache ---
+
+class MemoryCacheBackend:
+    """In-process LRU backend (the default). Each worker process has its own copy."""
+    errors = ()
+
+    def __init__(self, maxsize, ttl):
+        self.store = TTLCache(maxsize, ttl)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, value):
+        self.store.set(key, value)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.store.invalidate(key)
+
+    def counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+
+    def acquire(self, key, seconds):
+        return True # In-process callers are already serialized by ReadThroughCache
+
+    def release(self, key):
+        pass
+
+    def stats(self):
+        return {'backend': 'memory', **self.store.stats()}
+
+class RedisCacheBackend:
+    """Redis-compatible backend shared by every worker; invalidations reach all of them at once."""
+    errors = (redis.RedisError,) if redis else ()
+
+    def __init__(self, url, ttl):
+        if redis is None:
+            raise RuntimeError('VEHICLE_CACHE_BACKEND=redis needs the redis package (pip install redis)')
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        value = self.client.get(key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value):
+        self.client.set(key, value, ex=self.ttl)
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*keys)
+
+    def counter(self, key):
+        return int(self.client.get(key) or 0)
+
+    def incr(self, key):
+        self.client.incr(key)
+
+    def acquire(self, key, seconds):
+        return bool(self.client.set(f'lock:{key}', os.getpid(), nx=True, px=int(seconds * 1000)))
+
+    def release(self, key):
+        self.client.delete(f'lock:{key}')
+
+    def stats(self):
+        info = self.client.info('stats')
+        return {'backend': 'redis', 'hits': info.get('keyspace_hits'), 'misses': info.get('keyspace_misses')}
+
+class ReadThroughCache:
+    """
+    Read-through cache of serialized vehicle reads over a pluggable backend.
+    Stampede guard: when an entry is missing, one request per process loads it while
+    the others wait for the result, and with a shared backend a short lock key
+    extends that to one loader across all workers.
+    """
+    def __init__(self, config):
+        self._flights = {} # key -> threading.Event set when the loading request is done
+        self._lock = threading.Lock()
+        if config['VEHICLE_CACHE_BACKEND'] == 'redis':
+            self.backend = RedisCacheBackend(config['VEHICLE_CACHE_URL'], config['VEHICLE_CACHE_TTL'])
+        else:
+            self.backend = MemoryCacheBackend(config['VEHICLE_CACHE_MAXSIZE'], config['VEHICLE_CACHE_TTL'])
+        self.lock_wait = config['VEHICLE_CACHE_LOCK_WAIT']
+
+    def get_or_load(self, key, loader):
+        """Return the cached string for `key`, calling loader() to fill it on a miss."""
+        try:
+            return self._get_or_load(key, loader)
+        except self.backend.errors as e:
+            # A cache outage must not take reads down with it
+            logger.warning('Vehicle cache unavailable, reading from Mongo: %s', e)
+            return loader()
+
+    def _get_or_load(self, key, loader):
+        value = self.backend.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = threading.Event()
+        if not leader:
+            flight.wait(self.lock_wait)
+            value = self.backend.get(key)
+            return value if value is not None else loader()
+
+        try:
+            if not self.backend.acquire(key, self.lock_wait):
+                # Another worker is loading it: poll briefly for its result
+                deadline = time.monotonic() + self.lock_wait
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    value = self.backend.get(key)
+                    if value is not None:
+                        return value
+                return loader()
+            try:
+                value = loader()
+                if value is not None:
+                    self.backend.set(key, value)
+                return value
+            finally:
+                self.backend.release(key)
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.set()
+
+    def delete(self, *keys):
+        try:
+            self.backend.delete(*keys)
+        except self.backend.errors as e:
+            logger.warning('Could not invalidate %s in the vehicle cache: %s', keys, e)
+
+    def generation(self, name):
+        """Version number folded into keys that are invalidated as a group."""
+        try:
+            return self.backend.counter(f'generation:{name}')
+        except self.backend.errors:
+            return 0
+
+    def bump(self, name):
+        try:
+            self.backend.incr(f'generation:{name}')
+        except self.backend.errors as e:
+            logger.warning('Could not invalidate %s in the vehicle cache: %s', name, e)
+
+    def stats(self):
+        return self.backend.stats()
+
+vehicle_cache = AppLocal('vehicle_cache')
+
+def vehicle_key(vehicle_id):
+    return f'vehicle:{vehicle_id}'
+
+def pack_entry(meta, body):
+    """Cache entries are a one-line header (owner ID, next cursor) followed by the JSON body."""
+    return f"{meta or ''}\n{body}"
+
+def unpack_entry(entry):
+    meta, body = entry.split('\n', 1)
+    return meta or None, body
+
+def invalidate_vehicle_caches(*vehicle_ids):
+    """
+    Drop everything derived from the vehicles collection. Call after any vehicle
+    write, passing the IDs of the vehicles whose documents changed.
+    """
+    facet_cache.clear()
+    vehicle_cache.bump('available') # Every cached page of the available listing
+    vehicle_cache.delete(*[vehicle_key(vehicle_id) for vehicle_id in vehicle_ids])
+
+def load_current_user(user_id, role=None):
+    """
+    Return a JSON-safe copy of the user, served from user_cache when possible.
+    `role` is the one the access token was issued for; a cached entry with another
+    role predates a role change made through another worker, so it is reloaded.
+    """
+    current_user = user_cache.get(user_id)
+    if current_user is not None and role and current_user.get('role') != role:
+        current_user = None
+    (user_cache_misses if current_user is None else user_cache_hits).inc()
+    if current_user is None:
+        current_user_doc = users_collection.find_one({'_id': ObjectId(user_id)})
+        if not current_user_doc:
+            return None
+        current_user = to_json(current_user_doc)
+        user_cache.set(user_id, current_user)
+    # Routes may mutate current_user (e.g. popping the password), so never hand out the cached dict
+    return copy.deepcopy(current_user)
+
+def invalidate_user(user_id):
+    """
+    Drop a user from this worker's cache after any write to their document. Other
+    workers catch up within USER_CACHE_TTL, or on the next request whose token
+    names a different role (see load_current_user).
+    """
+    user_cache.invalidate(str(user_id))
+
+# --- Password Hashing ---
+
+class HashingBusy(Exception):
+    """Raised when the hashing queue is full."""
+
+_hash_prefixes = {} # PASSWORD_HASH_METHOD -> method part of the hashes it produces
+
+class WorkerPool:
+    """
+    A process pool of one app for CPU-bound jobs, plus (given max_queued) a semaphore
+    bounding the jobs this worker process has in flight. Both are created on first use and again after a fork;
+    children come from a forkserver rather than a fork of this multi-threaded worker, so
+    they never inherit a lock held by another thread.
+    """
+    def __init__(self, max_workers, max_queued=None):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def executor(self, broken=None):
+        """Pass the executor that raised BrokenProcessPool (a child was killed) to get a fresh one."""
+        with self._lock:
+            self._check_pid()
+            if self._executor is None or self._executor is broken:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('forkserver'))
+            return self._executor
+
+    @property
+    def slots(self):
+        with self._lock:
+            self._check_pid()
+            if self._slots is None:
+                self._slots = threading.BoundedSemaphore(self.max_queued)
+            return self._slots
+
+    def submit(self, fn, *args):
+        """Submit a job, replacing the executor once if it turned out broken."""
+        executor = self.executor()
+        try:
+            return executor.submit(fn, *args)
+        except BrokenProcessPool:
+            return self.executor(broken=executor).submit(fn, *args)
+
+    def _check_pid(self):
+        if self._pid != os.getpid(): # Forked: the parent's executor and semaphore are not ours
+            self._executor = self._slots = None
+            self._pid = os.getpid()
+
+# Hashes are CPU bound on purpose; running them in a process pool keeps the GIL free for other requests
+hash_workers = AppLocal('hash_workers')
+
+def hash_pool(broken=None):
+    """This app's password hashing pool in this worker process."""
+    return hash_workers.executor(broken)
+
+def hash_slots():
+    """Semaphore bounding the hash jobs this worker process has in flight."""
+    return hash_workers.slots
+
+def submit_hash_job(fn, *args):
+    """Submit a job to the hashing pool, replacing the pool once if it turned out broken."""
+    return hash_workers.submit(fn, *args)
+
+def run_hash_job(fn, *args):
+    """Run a hashing function in the pool, waiting for a queue slot first. Raises HashingBusy."""
+    slots = hash_slots()
+    if not slots.acquire(timeout=current_app.config['PASSWORD_HASH_WAIT']):
+        raise HashingBusy()
+    try:
+        pool = hash_pool()
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool: # A child died mid-job (e.g. the OOM killer): start a new pool and retry once
+            return hash_pool(broken=pool).submit(fn, *args).result()
+    finally:
+        slots.release()
+
+def hash_password(password):
+    return run_hash_job(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
+def verify_password(password_hash, password):
+    return run_hash_job(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    """
+    True when a stored hash was made with other parameters than PASSWORD_HASH_METHOD.
+    Werkzeug expands short methods ('scrypt', 'pbkdf2') to their full parameters, so
+    compare with a hash the method actually produces, made once per process.
+    """
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    if method not in _hash_prefixes:
+        _hash_prefixes[method] = run_hash_job(generate_password_hash, '', method).split('$', 1)[0]
+    return password_hash.split('$', 1)[0] != _hash_prefixes[method]
+
+def upgrade_password_hash(user_id, old_hash, password):
+    """
+    Rehash a password with the current parameters in the background. The write is
+    guarded on the old hash so it never clobbers a password changed meanwhile.
+    Upgrades take a queue slot like any hash job; when none is free the upgrade is
+    skipped and happens on a later login.
+    """
+    slots = hash_slots()
+    if not slots.acquire(blocking=False):
+        return
+    app = current_app._get_current_object()
+
+    def store(future):
+        slots.release()
+        if future.exception() is None:
+            with app.app_context():
+                users_collection.update_one({'_id': user_id, 'password': old_hash}, {'$set': {'password': future.result()}})
+                invalidate_user(user_id)
+    try:
+        future = submit_hash_job(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+    except Exception:
+        slots.release()
+        raise
+    future.add_done_callback(store)
+
+@bp.app_errorhandler(HashingBusy)
+def handle_hashing_busy(e):
+    response = jsonify({'message': 'Server is busy, please try again.'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
 # --- Authentication Decorators ---
 def token_required(f):
     """
@@ -65,16 +1343,12 @@ def token_required(f):
             return jsonify({'message': 'Token is missing!'}), 401
         
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-            # Ensure user_id from token is always an ObjectId for DB query
-            user_id_obj = ObjectId(data['user_id'])
-            current_user_doc = users_collection.find_one({'_id': user_id_obj})
+            data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=["HS256"])
+            # Cached users are already JSON-safe; a miss fetches and converts the document
+            current_user = load_current_user(str(ObjectId(data['user_id'])), data.get('role'))
             
-            if not current_user_doc:
+            if not current_user:
                 return jsonify({'message': 'User not found!'}), 401
-            
-            # Convert the fetched user document to JSON-safe format immediately
-            current_user = to_json(current_user_doc) 
 
             # If the endpoint is for setting a role, check the token's purpose
             if request.path.endswith('/role') and request.method == 'PUT':
@@ -104,7 +1378,7 @@ def role_required(role):
 
 # --- User Authentication Routes ---
 
-@app.route('/register', methods=['POST'])
+@bp.route('/register', methods=['POST'])
 def register():
     """User registration route."""
     data = request.get_json()
@@ -114,7 +1388,7 @@ def register():
     if users_collection.find_one({'username': data['username']}):
         return jsonify({'message': 'Username already exists!'}), 409
 
-    hashed_password = generate_password_hash(data['password'])
+    hashed_password = hash_password(data['password'])
     
     new_user = {
         'username': data['username'],
@@ -125,7 +1399,10 @@ def register():
         'role': None, # Role is set after signup
         'created_at': datetime.datetime.utcnow()
     }
-    result = users_collection.insert_one(new_user)
+    try:
+        result = users_collection.insert_one(new_user)
+    except DuplicateKeyError: # Lost a race with a concurrent signup for the same username
+        return jsonify({'message': 'Username already exists!'}), 409
 
     # After creating the user, issue a temporary token for role selection
     inserted_id = result.inserted_id
@@ -133,7 +1410,7 @@ def register():
         'user_id': str(inserted_id), # Store as string in token
         'purpose': 'set-role', # Indicate this token is for role setting
         'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=15)
-    }, app.config['SECRET_KEY'], algorithm="HS256")
+    }, current_app.config['SECRET_KEY'], algorithm="HS256")
 
     return jsonify({
         'message': 'User registered successfully! Please select a role using the provided token.', 
@@ -141,7 +1418,7 @@ def register():
         'username': data['username']
     }), 201
 
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
 def login():
     """User login route."""
     auth = request.get_json()
@@ -152,14 +1429,16 @@ def login():
     if not user:
         return jsonify({'message': 'User not found!'}), 401
 
-    if check_password_hash(user['password'], auth['password']):
+    if verify_password(user['password'], auth['password']):
+        if needs_rehash(user['password']):
+            upgrade_password_hash(user['_id'], user['password'], auth['password'])
         if not user.get('role'):
             # User has no role, issue a temporary token for role selection
             temp_token = jwt.encode({
                 'user_id': str(user['_id']), # Store as string in token
                 'purpose': 'set-role',
                 'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=15)
-            }, app.config['SECRET_KEY'], algorithm="HS256")
+            }, current_app.config['SECRET_KEY'], algorithm="HS256")
             
             return jsonify({
                 'message': 'Please select a role before logging in.', 
@@ -173,12 +1452,12 @@ def login():
                 'user_id': str(user['_id']), # Store as string in token
                 'role': user['role'],
                 'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-            }, app.config['SECRET_KEY'], algorithm="HS256")
+            }, current_app.config['SECRET_KEY'], algorithm="HS256")
             return jsonify({'token': token, 'role': user['role'], 'message': 'Logged in successfully'})
 
     return jsonify({'message': 'Invalid password!'}), 401
 
-@app.route('/profile', methods=['GET'])
+@bp.route('/profile', methods=['GET'])
 @token_required
 def get_profile(current_user):
     """Get user profile information."""
@@ -186,7 +1465,7 @@ def get_profile(current_user):
     current_user.pop('password', None) # Remove password, as it's not needed by the client
     return jsonify(current_user)
 
-@app.route('/users/<username>/role', methods=['PUT'])
+@bp.route('/users/<username>/role', methods=['PUT'])
 @token_required
 def set_user_role(current_user, username):
     """Set user role after signup or login."""
@@ -205,13 +1484,14 @@ def set_user_role(current_user, username):
     
     # Update the role in the database using the original ObjectId (which is now string in current_user)
     users_collection.update_one({'_id': ObjectId(current_user['_id'])}, {'$set': {'role': role}})
+    invalidate_user(current_user['_id'])
     
     # After setting the role, issue a standard access token to complete the login cycle
     token = jwt.encode({
         'user_id': current_user['_id'], # current_user['_id'] is already a string here
         'role': role,
         'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-    }, app.config['SECRET_KEY'], algorithm="HS256")
+    }, current_app.config['SECRET_KEY'], algorithm="HS256")
 
     return jsonify({
         'message': f'Role updated to {role} successfully! You are now logged in.',
@@ -219,27 +1499,125 @@ def set_user_role(current_user, username):
         'role': role
     })
 
-# --- Vehicle Routes (CRUD) ---
+@bp.route('/cache/stats', methods=['GET'])
+@token_required
+def get_cache_stats(current_user):
+    """Hit/miss counters for the in-process caches."""
+    return jsonify({'user_cache': user_cache.stats(), 'facet_cache': facet_cache.stats(), 'vehicle_cache': vehicle_cache.stats()})
 
-@app.route('/vehicles', methods=['POST'])
+@bp.route('/pool/stats', methods=['GET'])
 @token_required
-@role_required('owner')
-def add_vehicle(current_user):
-    """Add a new vehicle (owner only)."""
-    # current_user is already converted to JSON-safe dict by token_required
-    data = request.get_json()
-    # Basic validation
-    required_fields = ['vehicle_name', 'model', 'type', 'rent_price', 'location']
-    if not all(field in data for field in required_fields):
-        return jsonify({'message': 'Missing required vehicle fields!'}), 400
+def get_pool_stats(current_user):
+    """Mongo connection pool checkout waits for this worker process."""
+    stats = pool_stats.stats()
+    stats['max_pool_size'] = current_app.config['MONGO_MAX_POOL_SIZE']
+    return jsonify(stats)
+
+@bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint; under gunicorn it reports the whole worker pool."""
+    return Response(render_metrics(), content_type=CONTENT_TYPE_LATEST)
 
+@bp.route('/health', methods=['GET'])
+def health():
+    """Liveness check that also proves this worker can reach Mongo."""
     try:
-        rent_price = float(data['rent_price'])
-    except ValueError:
-        return jsonify({'message': 'Rent price must be a valid number'}), 400
+        mongo.client.admin.command('ping')
+    except Exception as e:
+        return jsonify({'status': 'unavailable', 'error': str(e)}), 503
+    return jsonify({'status': 'ok'})
+
+# --- Event Stream Route ---
+
+@bp.route('/events', methods=['GET'])
+@token_required
+def stream_events(current_user):
+    """
+    Server-Sent Events stream of booking and vehicle changes relevant to the user.
+    Reconnecting clients send Last-Event-ID (or ?last_event_id=) and get the events
+    they missed; if those are no longer in the log they receive a `reset` event and
+    should refetch their lists. Delivery is at least once: a reconnect also resends
+    events from the EVENTS_LOOKBACK_SECONDS before the last one it saw.
+    """
+    # current_user is already converted to JSON-safe dict by token_required
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0)
+    except ValueError:
+        return jsonify({'message': 'Invalid Last-Event-ID'}), 400
+
+    config = current_app.config
+    keys = subscriber_keys(current_user)
+    # Subscribe before replaying so nothing published in between is lost
+    subscriber = event_hub.subscribe(keys, config['EVENTS_BUFFER'], config['EVENTS_MAX_STREAMS'])
+    if subscriber is None:
+        # Every stream pins a worker thread; past the cap the client retries (EventSource does on its own)
+        response = jsonify({'message': 'Too many open event streams, please try again.'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    replay, reset = [], False
+    try:
+        if last_id:
+            oldest = next(events_collection.find({}, {'seq': 1}).sort('seq', ASCENDING).limit(1), None)
+            # Events numbered below last_id may have been inserted after it: resend the lookback window too
+            missed = {'seq': {'$gt': last_id}}
+            anchor = events_collection.find_one({'seq': last_id}, {'created_at': 1})
+            if anchor:
+                missed = {'$or': [missed, {'seq': {'$lt': last_id}, 'created_at': {'$gte': anchor['created_at'] - event_hub.lookback}}]}
+            replay = list(events_collection.find({**missed, 'audience': {'$in': keys}})
+                          .sort('seq', ASCENDING).limit(config['EVENTS_REPLAY_LIMIT'] + 1))
+            reset = (oldest is not None and oldest['seq'] > last_id + 1) or len(replay) > config['EVENTS_REPLAY_LIMIT']
+    except Exception:
+        event_hub.unsubscribe(subscriber)
+        raise
+    heartbeat = config['EVENTS_HEARTBEAT']
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n' # Reconnect delay for EventSource clients, in ms
+            if reset:
+                yield 'event: reset\ndata: {}\n\n'
+            sent = set()
+            for event in ([] if reset else replay):
+                sent.add(event['seq'])
+                yield format_event(event)
+            while True:
+                events = subscriber.wait(heartbeat)
+                if subscriber.overflowed:
+                    yield 'event: reset\ndata: {}\n\n'
+                    return # The client reconnects and refetches
+                if not events:
+                    yield ': keep-alive\n\n'
+                for event in events:
+                    if event['seq'] not in sent:
+                        yield format_event(event)
+        finally:
+            event_hub.unsubscribe(subscriber)
+
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no' # Stop nginx from buffering the stream
+    })
+    response.call_on_close(lambda: event_hub.unsubscribe(subscriber)) # Also when the body was never iterated
+    return response
+
+# --- Vehicle Routes (CRUD) ---
+
+VEHICLE_REQUIRED_FIELDS = ['vehicle_name', 'model', 'type', 'rent_price', 'location']
+
+def build_vehicle(data, owner_id):
+    """Validate one vehicle payload. Returns (document, None) or (None, error message)."""
+    # Basic validation
+    if not isinstance(data, dict) or not all(field in data for field in VEHICLE_REQUIRED_FIELDS):
+        return None, 'Missing required vehicle fields!'
+
+    try:
+        rent_price = float(data['rent_price'])
+    except (TypeError, ValueError):
+        return None, 'Rent price must be a valid number'
 
     new_vehicle = {
-        'owner_id': ObjectId(current_user['_id']), # Convert back to ObjectId for DB storage
+        'owner_id': owner_id,
         'vehicle_name': data['vehicle_name'],
         'model': data['model'],
         'type': data['type'],
@@ -250,22 +1628,391 @@ def add_vehicle(current_user):
         'location': data['location'], # Expects an object like {lat: float, lng: float}
         'created_at': datetime.datetime.utcnow()
     }
+    new_vehicle['updated_at'] = new_vehicle['created_at']
+    geo = location_to_geojson(data['location'])
+    if geo:
+        new_vehicle['geo'] = geo # GeoJSON copy of location backing /vehicles/nearby
+    return new_vehicle, None
+
+def csv_vehicle(row):
+    """Map a CSV row to a vehicle payload: latitude/longitude columns become the location object."""
+    data = {k.strip(): v.strip() for k, v in row.items() if k and v is not None and v.strip() != ''}
+    if 'location' not in data and 'latitude' in data and 'longitude' in data:
+        data['location'] = {'latitude': data.pop('latitude'), 'longitude': data.pop('longitude')}
+    if 'availability' in data:
+        data['availability'] = data['availability'].lower() not in ('false', '0', 'no', 'n')
+    return data
+
+def bulk_vehicle_rows():
+    """
+    Yield vehicle payloads from the request body without loading a streamed body whole:
+    a JSON array (or {"vehicles": [...]}), NDJSON (one object per line) or CSV with a header row.
+    Raises ValueError on a malformed body.
+    """
+    mimetype = request.mimetype
+    if mimetype in ('application/x-ndjson', 'application/jsonl'):
+        for line in io.TextIOWrapper(request.stream, encoding='utf-8'):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    yield None # Reported as an invalid row
+    elif mimetype == 'text/csv':
+        for row in csv.DictReader(io.TextIOWrapper(request.stream, encoding='utf-8', newline='')):
+            yield csv_vehicle(row)
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('vehicles')
+        if not isinstance(data, list):
+            raise ValueError('Expected a JSON array of vehicles, NDJSON or CSV')
+        yield from data
+
+@bp.route('/vehicles', methods=['POST'])
+@token_required
+@role_required('owner')
+def add_vehicle(current_user):
+    """Add a new vehicle (owner only)."""
+    # current_user is already converted to JSON-safe dict by token_required
+    new_vehicle, error = build_vehicle(request.get_json(), ObjectId(current_user['_id']))
+    if error:
+        return jsonify({'message': error}), 400
     vehicles_collection.insert_one(new_vehicle)
+    bump_owner_stats(new_vehicle['owner_id'], {'vehicles': 1, 'available_vehicles': 1 if new_vehicle['availability'] else 0})
+    invalidate_vehicle_caches()
+    publish_event('vehicle.created', new_vehicle['_id'], event_audience(new_vehicle['owner_id'], renters=True),
+                  availability=new_vehicle['availability'])
     return jsonify({'message': 'Vehicle added successfully!'}), 201
 
-@app.route('/vehicles', methods=['GET'])
+@bp.route('/vehicles/bulk', methods=['POST'])
+@token_required
+@role_required('owner')
+def add_vehicles_bulk(current_user):
+    """
+    Import many vehicles in one request (owner only). Rows are validated like POST /vehicles;
+    valid ones are written with insert_many every BULK_CHUNK_SIZE rows, invalid ones are
+    reported by row number (starting at 1) and skipped.
+    """
+    # current_user is already converted to JSON-safe dict by token_required
+    owner_id = ObjectId(current_user['_id'])
+    chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    max_rows = current_app.config['BULK_MAX_ROWS']
+    chunk, inserted_ids, errors = [], [], []
+    available = 0
+
+    def flush(chunk):
+        if chunk:
+            inserted_ids.extend(vehicles_collection.insert_many(chunk, ordered=False).inserted_ids)
+        return []
+
+    try:
+        for row_number, data in enumerate(bulk_vehicle_rows(), start=1):
+            if row_number > max_rows:
+                errors.append({'row': row_number, 'message': f'Only {max_rows} vehicles are accepted per request'})
+                break
+            new_vehicle, error = build_vehicle(data, owner_id)
+            if error:
+                errors.append({'row': row_number, 'message': error})
+                continue
+            available += 1 if new_vehicle['availability'] else 0
+            chunk.append(new_vehicle)
+            if len(chunk) >= chunk_size:
+                chunk = flush(chunk)
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        errors.append({'row': None, 'message': str(e)})
+    flush(chunk)
+
+    if inserted_ids:
+        bump_owner_stats(owner_id, {'vehicles': len(inserted_ids), 'available_vehicles': available})
+        invalidate_vehicle_caches()
+        publish_events([('vehicle.created', vehicle_id, event_audience(owner_id, renters=True), {})
+                        for vehicle_id in inserted_ids])
+    return jsonify({
+        'message': f'Imported {len(inserted_ids)} vehicles.',
+        'inserted': len(inserted_ids),
+        'ids': [str(vehicle_id) for vehicle_id in inserted_ids],
+        'errors': errors
+    }), 201 if inserted_ids else 400
+
+@bp.route('/vehicles', methods=['GET'])
 @token_required
 def get_all_vehicles(current_user):
-    """Get all vehicles. Owners see their own, renters see all available."""
+    """
+    Get all vehicles. Owners see their own, renters see all available.
+    Supports ?limit=&after= keyset pagination, a ?fields= sparse fieldset and ?since= delta sync.
+    """
     # current_user is already converted to JSON-safe dict by token_required
+    try:
+        limit, keyset_filter, projection = parse_list_args(VEHICLE_LIST_FIELDS)
+        since = parse_since()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
     if current_user['role'] == 'owner':
-        vehicles = vehicles_collection.find({'owner_id': ObjectId(current_user['_id'])})
+        query = {'owner_id': ObjectId(current_user['_id'])}
+        tombstone_filter = {'collection': 'vehicles', 'owner_id': query['owner_id']}
     else: # Renter
-        vehicles = vehicles_collection.find({'availability': True})
-    
-    return jsonify(to_json(list(vehicles)))
+        query = {'availability': True}
+        tombstone_filter = {'collection': 'vehicles'}
+
+    if since:
+        if current_user['role'] == 'owner':
+            return delta_response(vehicles_collection.find(changed_since(query, since), projection), since, tombstone_filter)
+        # Vehicles that stopped being available leave the renter's list
+        changed = vehicles_collection.find(changed_since({}, since), projection and {**projection, 'availability': 1})
+        return delta_response(changed, since, tombstone_filter, visible=lambda v: v.get('availability') is True)
+
+    if current_user['role'] != 'owner' and limit:
+        return available_vehicles_page(query, limit, keyset_filter, projection)
+
+    # Owner lists and the renter's full catalogue (no ?limit=) are streamed uncached; pages tag their own body
+    etag = None
+    if not limit:
+        etag = list_etag(vehicles_collection, query, current_user)
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+
+    if keyset_filter:
+        query = {'$and': [query, keyset_filter]}
+    vehicles = vehicles_collection.find(query, projection).sort(PAGE_SORT)
+    if limit:
+        vehicles = vehicles.limit(limit + 1)
+    response = page_response(vehicles.batch_size(current_app.config['STREAM_BATCH_SIZE']), limit)
+    if etag:
+        response.set_etag(etag)
+    return response
+
+def available_vehicles_page(query, limit, keyset_filter, projection):
+    """
+    The renter catalogue is identical for every renter, so each page is served
+    from vehicle_cache as ready-to-send JSON. Keys carry the 'available'
+    generation, which every vehicle write bumps. Only bounded pages come here, so
+    an entry never holds more than PAGE_MAX_LIMIT vehicles.
+    """
+    page_query = {'$and': [query, keyset_filter]} if keyset_filter else query
+    # Key on the parsed arguments so equivalent spellings (fields=a,b and fields=b,a) share an entry
+    args = [limit, request.args.get('after'), sorted(projection or [])]
+    key = f"vehicles:available:{vehicle_cache.generation('available')}:{hashlib.md5(json.dumps(args).encode()).hexdigest()}"
+
+    def load():
+        docs = list(vehicles_collection.find(page_query, projection).sort(PAGE_SORT).limit(limit + 1))
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_cursor(docs[-1])
+        return pack_entry(next_cursor, json.dumps(to_json(docs)))
+
+    next_cursor, body = unpack_entry(vehicle_cache.get_or_load(key, load))
+    response = Response(body, mimetype='application/json')
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    response.add_etag()
+    return response.make_conditional(request)
+
+@bp.route('/vehicles/nearby', methods=['GET'])
+@token_required
+def get_nearby_vehicles(current_user):
+    """
+    Available vehicles around ?lat=&lng=, nearest first.
+    Optional filters: radius_km, type, max_price. Paginated with limit/after; supports fields.
+    """
+    try:
+        lat = float(request.args['lat'])
+        lng = float(request.args['lng'])
+        radius_km = float(request.args.get('radius_km', current_app.config['NEARBY_DEFAULT_RADIUS_KM']))
+        max_price = request.args.get('max_price')
+        max_price = float(max_price) if max_price is not None else None
+    except KeyError:
+        return jsonify({'message': 'lat and lng are required'}), 400
+    except ValueError:
+        return jsonify({'message': 'lat, lng, radius_km and max_price must be numbers'}), 400
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return jsonify({'message': 'lat/lng out of range'}), 400
+    if radius_km <= 0:
+        return jsonify({'message': 'radius_km must be positive'}), 400
+    radius_km = min(radius_km, current_app.config['NEARBY_MAX_RADIUS_KM'])
+
+    try:
+        limit = int(request.args.get('limit', current_app.config['PAGE_DEFAULT_LIMIT']))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'message': 'limit must be a positive integer'}), 400
+    limit = min(limit, current_app.config['PAGE_MAX_LIMIT'])
+
+    query = {'availability': True}
+    if request.args.get('type'):
+        query['type'] = request.args['type']
+    if max_price is not None:
+        query['rent_price'] = {'$lte': max_price}
 
-@app.route('/vehicles/<vehicle_id>', methods=['GET'])
+    geo_near = {
+        'near': {'type': 'Point', 'coordinates': [lng, lat]},
+        'distanceField': 'distance', # meters
+        'maxDistance': radius_km * 1000,
+        'query': query,
+        'spherical': True
+    }
+    pipeline = [{'$geoNear': geo_near}]
+    after = request.args.get('after')
+    if after:
+        try:
+            min_distance, last_id = decode_distance_cursor(after)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+        geo_near['minDistance'] = min_distance
+        # Rows at exactly the cursor distance were already returned up to last_id
+        pipeline.append({'$match': {'$or': [
+            {'distance': {'$gt': min_distance}},
+            {'_id': {'$gt': last_id}}
+        ]}})
+    pipeline += [
+        {'$sort': {'distance': 1, '_id': 1}},
+        {'$limit': limit + 1},
+        {'$addFields': {'distance_km': {'$round': [{'$divide': ['$distance', 1000]}, 3]}}}
+    ]
+    try:
+        projection = parse_fields(request.args.get('fields'), VEHICLE_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if projection:
+        projection.update({'distance': 1, 'distance_km': 1})
+        pipeline.append({'$project': projection})
+
+    vehicles = vehicles_collection.aggregate(pipeline)
+    return page_response(vehicles, limit, cursor_for=encode_distance_cursor)
+
+@bp.route('/vehicles/search', methods=['GET'])
+@token_required
+def search_vehicles(current_user):
+    """
+    Search vehicles. Owners search their own, renters the available ones.
+    ?q= matches words in vehicle_name/model, ?type= takes one or more comma separated
+    types, ?min_price=/?max_price= bound rent_price and ?sort= is newest, price_asc or
+    price_desc. Paginated with limit/after; supports fields. The first page also
+    carries facet counts per type and price bucket (skip them with ?facets=0).
+    """
+    # current_user is already converted to JSON-safe dict by token_required
+    sort = SEARCH_SORTS.get(request.args.get('sort', 'newest'))
+    if sort is None:
+        return jsonify({'message': f"sort must be one of {', '.join(SEARCH_SORTS)}"}), 400
+    try:
+        min_price = float(request.args['min_price']) if request.args.get('min_price') else None
+        max_price = float(request.args['max_price']) if request.args.get('max_price') else None
+        limit = int(request.args.get('limit', current_app.config['PAGE_DEFAULT_LIMIT']))
+        if limit < 1:
+            raise ValueError
+    except ValueError:
+        return jsonify({'message': 'min_price and max_price must be numbers, limit a positive integer'}), 400
+    limit = min(limit, current_app.config['PAGE_MAX_LIMIT'])
+
+    if current_user['role'] == 'owner':
+        match = {'owner_id': ObjectId(current_user['_id'])}
+    else: # Renter
+        match = {'availability': True}
+    text = request.args.get('q', '').strip()
+    if text:
+        match['$text'] = {'$search': text}
+    types = sorted({t.strip() for t in request.args.get('type', '').split(',') if t.strip()})
+    type_filter = {'type': {'$in': types}} if types else {}
+    price_filter = {}
+    if min_price is not None:
+        price_filter.setdefault('rent_price', {})['$gte'] = min_price
+    if max_price is not None:
+        price_filter.setdefault('rent_price', {})['$lte'] = max_price
+
+    query = {**match, **type_filter, **price_filter}
+    after = request.args.get('after')
+    if after:
+        try:
+            query = {'$and': [query, decode_search_cursor(after, sort)]}
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+    try:
+        projection = parse_fields(request.args.get('fields'), VEHICLE_LIST_FIELDS)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    if projection:
+        projection[sort[0][0]] = 1 # Needed to build the next cursor
+    vehicles = list(vehicles_collection.find(query, projection).sort(sort).limit(limit + 1))
+
+    headers = {}
+    if len(vehicles) > limit:
+        vehicles = vehicles[:limit]
+        headers['X-Next-Cursor'] = search_cursor_for(sort)(vehicles[-1])
+    result = {'items': to_json(vehicles)}
+
+    if not after and request.args.get('facets') != '0':
+        # Every search screen opens with the same few filter combinations, so counts are cached
+        cache_key = json.dumps([str(match.get('owner_id', 'renters')), text, types, min_price, max_price])
+        facets = facet_cache.get(cache_key)
+        if facets is None:
+            facets = search_facets(match, type_filter, price_filter)
+            facet_cache.set(cache_key, facets)
+        result['facets'] = facets
+    return jsonify(result), 200, headers
+
+@bp.route('/vehicles/availability', methods=['POST'])
+@token_required
+def get_vehicles_availability(current_user):
+    """
+    Free and busy intervals for many vehicles inside one time window.
+    Body: {vehicle_ids: [...], start_time, end_time}. Answered from a single bookings aggregation.
+    """
+    data = request.get_json() or {}
+    if not all(k in data for k in ['vehicle_ids', 'start_time', 'end_time']):
+        return jsonify({'message': 'Missing availability query data'}), 400
+    if not isinstance(data['vehicle_ids'], list) or not data['vehicle_ids']:
+        return jsonify({'message': 'vehicle_ids must be a non-empty list'}), 400
+    if len(data['vehicle_ids']) > current_app.config['AVAILABILITY_MAX_VEHICLES']:
+        return jsonify({'message': f"At most {current_app.config['AVAILABILITY_MAX_VEHICLES']} vehicle_ids per request"}), 400
+
+    try:
+        vehicle_obj_ids = [ObjectId(v) for v in data['vehicle_ids']]
+    except Exception:
+        return jsonify({'message': 'Invalid vehicle ID format'}), 400
+
+    try:
+        # Bookings are stored in naive UTC; an offset such as +05:30 is converted, not compared as is
+        window_start = parse_timestamp(data['start_time'])
+        window_end = parse_timestamp(data['end_time'])
+    except (TypeError, ValueError, OverflowError, OSError):
+        return jsonify({'message': 'Invalid date/time format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
+    if window_start >= window_end:
+        return jsonify({'message': 'Start time must be before end time'}), 400
+
+    # Same predicate as the overlap check in create_booking, for every vehicle at once
+    pipeline = [
+        {'$match': {
+            'vehicle_id': {'$in': vehicle_obj_ids},
+            'status': {'$in': BLOCKING_STATUSES},
+            'start_time': {'$lt': window_end},
+            'end_time': {'$gt': window_start}
+        }},
+        {'$sort': {'vehicle_id': 1, 'start_time': 1}},
+        {'$group': {
+            '_id': '$vehicle_id',
+            'intervals': {'$push': {'start': '$start_time', 'end': '$end_time'}}
+        }}
+    ]
+    busy_by_vehicle = {
+        group['_id']: merge_intervals(
+            (max(i['start'], window_start), min(i['end'], window_end)) for i in group['intervals']
+        )
+        for group in bookings_collection.aggregate(pipeline)
+    }
+
+    result = {}
+    for obj_id in vehicle_obj_ids:
+        busy = busy_by_vehicle.get(obj_id, [])
+        result[str(obj_id)] = {
+            'available': not busy,
+            'busy': [{'start': s.isoformat(), 'end': e.isoformat()} for s, e in busy],
+            'free': [{'start': s.isoformat(), 'end': e.isoformat()} for s, e in free_intervals(busy, window_start, window_end)]
+        }
+    return jsonify(result)
+
+@bp.route('/vehicles/<vehicle_id>', methods=['GET'])
 @token_required
 def get_vehicle(current_user, vehicle_id):
     """Get a single vehicle by its ID."""
@@ -275,18 +2022,24 @@ def get_vehicle(current_user, vehicle_id):
     except Exception:
         return jsonify({'message': 'Invalid vehicle ID format'}), 400
         
-    vehicle = vehicles_collection.find_one({'_id': obj_id})
-    if not vehicle:
+    def load():
+        vehicle = vehicles_collection.find_one({'_id': obj_id})
+        return pack_entry(vehicle['owner_id'], json.dumps(to_json(vehicle))) if vehicle else None
+    entry = vehicle_cache.get_or_load(vehicle_key(obj_id), load)
+    if not entry:
         return jsonify({'message': 'Vehicle not found'}), 404
+    owner_id, body = unpack_entry(entry)
 
     # Authorization check for owner: ensure owner can only see their own vehicles
     # Renters can see any vehicle that is available.
-    if current_user['role'] == 'owner' and vehicle['owner_id'] != ObjectId(current_user['_id']):
+    if current_user['role'] == 'owner' and owner_id != current_user['_id']:
         return jsonify({'message': 'Unauthorized to view this vehicle'}), 403
     
-    return jsonify(to_json(vehicle))
+    response = Response(body, mimetype='application/json')
+    response.add_etag()
+    return response.make_conditional(request)
 
-@app.route('/vehicles/<vehicle_id>', methods=['PUT'])
+@bp.route('/vehicles/<vehicle_id>', methods=['PUT'])
 @token_required
 @role_required('owner')
 def update_vehicle(current_user, vehicle_id):
@@ -312,12 +2065,29 @@ def update_vehicle(current_user, vehicle_id):
         except ValueError:
             return jsonify({'message': 'Rent price must be a valid number'}), 400
 
+    update_ops = {}
+    if 'location' in update_data:
+        geo = location_to_geojson(update_data['location'])
+        if geo:
+            update_data['geo'] = geo
+        else:
+            update_ops['$unset'] = {'geo': ''}
     if update_data:
-        vehicles_collection.update_one({'_id': obj_id}, {'$set': update_data})
+        update_ops['$set'] = {**update_data, 'updated_at': datetime.datetime.utcnow()}
+        vehicles_collection.update_one({'_id': obj_id}, update_ops)
+        refresh_booking_summaries('vehicle_id', obj_id, 'vehicle_details', BOOKING_VEHICLE_FIELDS, update_data)
+        if 'availability' in update_data:
+            was_available = vehicle.get('availability', True) is not False
+            is_available = update_data['availability'] is not False
+            bump_owner_stats(vehicle['owner_id'], {'available_vehicles': int(is_available) - int(was_available)})
+        invalidate_vehicle_caches(obj_id)
+        publish_event('vehicle.updated', obj_id, event_audience(vehicle['owner_id'], renters=True),
+                      fields=sorted(k for k in update_data if k != 'geo'),
+                      availability=update_data.get('availability', vehicle.get('availability', True)))
     
     return jsonify({'message': 'Vehicle updated successfully'})
 
-@app.route('/vehicles/<vehicle_id>', methods=['DELETE'])
+@bp.route('/vehicles/<vehicle_id>', methods=['DELETE'])
 @token_required
 @role_required('owner')
 def delete_vehicle(current_user, vehicle_id):
@@ -338,7 +2108,7 @@ def delete_vehicle(current_user, vehicle_id):
     # for this vehicle. If so, prevent deletion or handle gracefully.
     active_bookings_count = bookings_collection.count_documents({
         'vehicle_id': obj_id,
-        'status': {'$in': ['pending', 'confirmed']}
+        'status': {'$in': BLOCKING_STATUSES}
     })
     if active_bookings_count > 0:
         return jsonify({
@@ -346,11 +2116,703 @@ def delete_vehicle(current_user, vehicle_id):
         }), 400
 
     vehicles_collection.delete_one({'_id': obj_id})
+    record_tombstone('vehicles', obj_id, owner_id=vehicle['owner_id'])
+    invalidate_vehicle_caches(obj_id)
+    publish_event('vehicle.deleted', obj_id, event_audience(vehicle['owner_id'], renters=True))
+    bump_owner_stats(vehicle['owner_id'], {
+        'vehicles': -1,
+        'available_vehicles': -1 if vehicle.get('availability', True) is not False else 0
+    })
     return jsonify({'message': 'Vehicle deleted successfully'})
 
+# --- Vehicle Images ---
+
+# Magic bytes of the formats we accept -> (extension, content type)
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', ('jpg', 'image/jpeg')),
+    (b'\x89PNG\r\n\x1a\n', ('png', 'image/png')),
+    (b'RIFF', ('webp', 'image/webp')), # Checked for the WEBP marker below
+]
+IMAGE_SLOTS = ['image1', 'image2']
+IMAGE_CACHE_CONTROL = 'public, max-age=31536000, immutable' # Keys are content hashes, so they never change
+
+def sniff_image(head):
+    """(extension, content type) for the first bytes of an upload, or None if it is not an accepted image."""
+    for signature, kind in IMAGE_SIGNATURES:
+        if head.startswith(signature) and (kind[0] != 'webp' or head[8:12] == b'WEBP'):
+            return kind
+    return None
+
+def image_settings(config):
+    """The IMAGE_* settings as a plain dict, so they can be handed to pool processes."""
+    return {k: v for k, v in config.items() if k.startswith('IMAGE_')}
+
+class LocalImageStorage:
+    """Images under IMAGE_LOCAL_DIR, served by GET /images/<key>."""
+    def __init__(self, settings):
+        self.root = settings['IMAGE_LOCAL_DIR']
+        self.base_url = settings['IMAGE_BASE_URL'].rstrip('/')
+
+    def exists(self, key):
+        return os.path.exists(os.path.join(self.root, key))
+
+    def put_file(self, key, path, content_type):
+        target = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target + '.part')
+        os.replace(target + '.part', target) # Readers never see a half-written file
+
+    def put_bytes(self, key, data, content_type):
+        target = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + '.part', 'wb') as f:
+            f.write(data)
+        os.replace(target + '.part', target)
+
+    def url(self, key):
+        return f'{self.base_url}/{key}'
+
+class S3ImageStorage:
+    """Images in IMAGE_S3_BUCKET under IMAGE_S3_PREFIX; IMAGE_BASE_URL points at the bucket or its CDN."""
+    def __init__(self, settings):
+        import boto3 # Only needed for IMAGE_STORAGE=s3
+        self.client = boto3.client('s3')
+        self.bucket = settings['IMAGE_S3_BUCKET']
+        self.prefix = settings['IMAGE_S3_PREFIX']
+        self.base_url = settings['IMAGE_BASE_URL'].rstrip('/')
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+            return True
+        except self.client.exceptions.ClientError:
+            return False
+
+    def put_file(self, key, path, content_type):
+        self.client.upload_file(path, self.bucket, self.prefix + key,
+                                ExtraArgs={'ContentType': content_type, 'CacheControl': IMAGE_CACHE_CONTROL})
+
+    def put_bytes(self, key, data, content_type):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data,
+                               ContentType=content_type, CacheControl=IMAGE_CACHE_CONTROL)
+
+    def url(self, key):
+        return f'{self.base_url}/{self.prefix}{key}'
+
+def image_storage(settings):
+    return S3ImageStorage(settings) if settings['IMAGE_STORAGE'] == 's3' else LocalImageStorage(settings)
+
+def image_key(digest, variant, extension):
+    """Content-addressed key, fanned out by hash prefix: ab/abcdef..._list.jpg"""
+    return f'{digest[:2]}/{digest}_{variant}.{extension}'
+
+def render_image_variants(path, digest, settings):
+    """
+    Runs in the image pool: write the thumbnail and list-size JPEG variants of the
+    upload at `path` to storage. Returns {variant: key}.
+    """
+    from PIL import Image, ImageOps # Imported in the pool processes only
+    storage = image_storage(settings)
+    keys = {}
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB') # Phone photos carry their rotation in EXIF
+        for variant, size in [('list', settings['IMAGE_LIST_SIZE']), ('thumb', settings['IMAGE_THUMB_SIZE'])]:
+            key = image_key(digest, variant, 'jpg')
+            if not storage.exists(key):
+                copy_ = image.copy()
+                copy_.thumbnail((size, size))
+                out = io.BytesIO()
+                copy_.save(out, 'JPEG', quality=80, optimize=True, progressive=True)
+                storage.put_bytes(key, out.getvalue(), 'image/jpeg')
+            keys[variant] = key
+    return keys
+
+image_workers = AppLocal('image_workers')
+
+def image_pool(broken=None):
+    """This app's pool for rendering image variants in this worker process."""
+    return image_workers.executor(broken)
+
+def submit_image_job(fn, *args):
+    """Submit a job to the image pool, replacing the pool once if it turned out broken."""
+    return image_workers.submit(fn, *args)
+
+UPLOAD_FORM_OVERHEAD = 64 * 1024 # Bytes of a multipart body allowed beyond the image itself
+
+class UploadTooLarge(ValueError):
+    """Raised by receive_upload when the body exceeds the size limit."""
+
+def receive_upload(max_bytes):
+    """
+    Stream the request body (raw, or the `file` part of a multipart form) to a
+    temporary file while hashing it. Returns (path, sha256 hex digest, first bytes).
+    Raises UploadTooLarge past max_bytes and ValueError when the body is empty.
+    """
+    multipart = request.mimetype == 'multipart/form-data'
+    # request.files parses (and spools) the whole form before a byte of it reaches us, so bound it
+    # by Content-Length first; the form's boundaries and part headers get some slack on top
+    limit = max_bytes + (UPLOAD_FORM_OVERHEAD if multipart else 0)
+    if request.content_length is not None and request.content_length > limit:
+        raise UploadTooLarge(f'Images are limited to {max_bytes // (1024 * 1024)} MB')
+    if multipart and request.content_length is None:
+        raise ValueError('Multipart uploads need a Content-Length; send the image as the raw body instead')
+    source = request.files['file'].stream if request.files.get('file') else request.stream
+    digest = hashlib.sha256()
+    size, head = 0, b''
+    with tempfile.NamedTemporaryFile(prefix='upload-', delete=False) as tmp:
+        try:
+            for chunk in iter(lambda: source.read(64 * 1024), b''):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f'Images are limited to {max_bytes // (1024 * 1024)} MB')
+                if len(head) < 16:
+                    head += chunk[:16 - len(head)]
+                digest.update(chunk)
+                tmp.write(chunk)
+            if not size:
+                raise ValueError('Empty upload')
+        except ValueError:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+    return tmp.name, digest.hexdigest(), head
+
+@bp.route('/vehicles/<vehicle_id>/images/<any(image1, image2):slot>', methods=['POST'])
+@token_required
+@role_required('owner')
+def upload_vehicle_image(current_user, vehicle_id, slot):
+    """
+    Upload the vehicle's image1 or image2 (owner only) as a raw JPEG/PNG/WebP body or a
+    multipart `file`. The original is stored under its content hash right away; the
+    list-size and thumbnail variants are rendered in the image pool, and once they exist
+    `<slot>_url` points at the list-size one and `<slot>_thumb_url` at the thumbnail.
+    """
+    # current_user is already converted to JSON-safe dict by token_required
+    try:
+        obj_id = ObjectId(vehicle_id)
+    except Exception:
+        return jsonify({'message': 'Invalid vehicle ID format'}), 400
+    vehicle = vehicles_collection.find_one({'_id': obj_id}, {'owner_id': 1})
+    if not vehicle:
+        return jsonify({'message': 'Vehicle not found'}), 404
+    if vehicle['owner_id'] != ObjectId(current_user['_id']):
+        return jsonify({'message': 'Unauthorized to update this vehicle'}), 403
+
+    try:
+        path, digest, head = receive_upload(current_app.config['IMAGE_MAX_BYTES'])
+    except UploadTooLarge as e:
+        return jsonify({'message': str(e)}), 413
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    kind = sniff_image(head)
+    if not kind:
+        os.unlink(path)
+        return jsonify({'message': 'Only JPEG, PNG and WebP images are accepted'}), 415
+
+    settings = image_settings(current_app.config)
+    storage = image_storage(settings)
+    try:
+        original_key = image_key(digest, 'original', kind[0])
+        if not storage.exists(original_key): # Same photo uploaded before: nothing to write
+            storage.put_file(original_key, path, kind[1])
+    except Exception:
+        os.unlink(path)
+        raise
+    now = datetime.datetime.utcnow()
+    vehicles_collection.update_one({'_id': obj_id}, {'$set': {
+        f'images.{slot}': {'hash': digest, 'original_url': storage.url(original_key), 'status': 'processing'},
+        'updated_at': now
+    }})
+    invalidate_vehicle_caches(obj_id)
+
+    app = current_app._get_current_object()
+    def store_variants(future):
+        os.unlink(path)
+        with app.app_context():
+            # Guarded on the hash: a newer upload to the same slot wins
+            guard = {'_id': obj_id, f'images.{slot}.hash': digest}
+            if future.exception() is not None:
+                app.logger.warning('Rendering %s of vehicle %s failed: %s', slot, obj_id, future.exception())
+                vehicles_collection.update_one(guard, {'$set': {f'images.{slot}.status': 'failed'}})
+                invalidate_vehicle_caches(obj_id)
+                return
+            urls = {variant: storage.url(key) for variant, key in future.result().items()}
+            changed = {f'{slot}_url': urls['list'], f'{slot}_thumb_url': urls['thumb']}
+            updated = vehicles_collection.update_one(guard, {'$set': {
+                **changed,
+                f'images.{slot}.list_url': urls['list'],
+                f'images.{slot}.thumb_url': urls['thumb'],
+                f'images.{slot}.status': 'ready',
+                'updated_at': datetime.datetime.utcnow()
+            }})
+            if updated.modified_count:
+                refresh_booking_summaries('vehicle_id', obj_id, 'vehicle_details', BOOKING_VEHICLE_FIELDS, changed)
+                invalidate_vehicle_caches(obj_id)
+                publish_event('vehicle.updated', obj_id, event_audience(vehicle['owner_id'], renters=True),
+                              fields=sorted(changed))
+    try:
+        future = submit_image_job(render_image_variants, path, digest, settings)
+    except Exception: # Nothing will render this upload: don't leave the slot 'processing' or the file behind
+        os.unlink(path)
+        vehicles_collection.update_one({'_id': obj_id, f'images.{slot}.hash': digest},
+                                       {'$set': {f'images.{slot}.status': 'failed'}})
+        invalidate_vehicle_caches(obj_id)
+        raise
+    future.add_done_callback(store_variants)
+
+    return jsonify({
+        'message': 'Image uploaded; smaller versions are being prepared.',
+        'original_url': storage.url(original_key),
+        'hash': digest
+    }), 202
+
+@bp.route('/images/<path:key>', methods=['GET'])
+def get_image(key):
+    """Serve locally stored images. Keys are content hashes, so responses are cacheable forever."""
+    response = send_from_directory(current_app.config['IMAGE_LOCAL_DIR'], key, max_age=31536000)
+    response.headers['Cache-Control'] = IMAGE_CACHE_CONTROL
+    return response
+
+# --- Telemetry ---
+
+# Optional per-position readings stored alongside the coordinates
+TELEMETRY_EXTRA_FIELDS = ['speed', 'heading', 'accuracy']
+
+def parse_timestamp(value):
+    """
+    Parse an ISO 8601 string or a Unix epoch (seconds or milliseconds) into a
+    naive UTC datetime. Raises ValueError if the value is neither.
+    """
+    if isinstance(value, bool):
+        raise ValueError('Invalid timestamp')
+    if isinstance(value, (int, float)):
+        seconds = value / 1000 if value > 1e11 else value # JavaScript clocks send milliseconds
+        return datetime.datetime.utcfromtimestamp(seconds)
+    parsed = datetime.datetime.fromisoformat(str(value))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def parse_position(vehicle_id, point, oldest, newest):
+    """Build a telemetry document from one reported position, or None if it is unusable."""
+    if not isinstance(point, dict):
+        return None
+    geo = location_to_geojson(point)
+    try:
+        ts = parse_timestamp(point.get('ts', point.get('timestamp')))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+    if not geo or not oldest <= ts <= newest:
+        return None
+    lng, lat = geo['coordinates']
+    doc = {'vehicle_id': vehicle_id, 'ts': ts, 'latitude': lat, 'longitude': lng}
+    for field in TELEMETRY_EXTRA_FIELDS:
+        if isinstance(point.get(field), (int, float)) and not isinstance(point.get(field), bool):
+            doc[field] = point[field]
+    return doc
+
+def trackable_vehicle_ids(current_user, vehicle_ids):
+    """
+    The subset of vehicle_ids whose positions the user may report and read: owners
+    their own vehicles, renters the vehicles they hold a confirmed booking for.
+    """
+    user_id = ObjectId(current_user['_id'])
+    if current_user['role'] == 'owner':
+        return set(vehicles_collection.distinct('_id', {'_id': {'$in': vehicle_ids}, 'owner_id': user_id}))
+    return set(bookings_collection.distinct('vehicle_id', {
+        'renter_id': user_id, 'vehicle_id': {'$in': vehicle_ids}, 'status': 'confirmed'
+    }))
+
+@bp.route('/telemetry', methods=['POST'])
+@token_required
+def ingest_telemetry(current_user):
+    """
+    Batched GPS ingest. Body: {"vehicles": [{"vehicle_id": ..., "positions": [{"ts", "latitude", "longitude",
+    "speed"?, "heading"?, "accuracy"?}, ...]}, ...]}. Positions go to the telemetry time-series collection in
+    one insert_many, and each vehicle's newest position is copied to `last_position` with one bulk_write.
+    last_position is live state for the vehicle detail and /track; list ETags and ?since= do not follow it.
+    Unusable positions (bad coordinates, timestamps in the future or past the TTL) are skipped and counted.
+    """
+    # current_user is already converted to JSON-safe dict by token_required
+    data = request.get_json(silent=True) or {}
+    batches = data.get('vehicles')
+    if not isinstance(batches, list) or not batches or not all(isinstance(b, dict) for b in batches):
+        return jsonify({'message': 'Expected a non-empty "vehicles" list'}), 400
+    if any(not isinstance(b.get('positions'), list) for b in batches):
+        return jsonify({'message': 'Each vehicle needs a "positions" list'}), 400
+    if sum(len(b['positions']) for b in batches) > current_app.config['TELEMETRY_MAX_POINTS']:
+        return jsonify({'message': f"At most {current_app.config['TELEMETRY_MAX_POINTS']} positions per request"}), 413
+    try:
+        vehicle_ids = [ObjectId(b.get('vehicle_id')) for b in batches]
+    except Exception:
+        return jsonify({'message': 'Invalid vehicle ID format'}), 400
+
+    if trackable_vehicle_ids(current_user, vehicle_ids) != set(vehicle_ids):
+        return jsonify({'message': 'Unauthorized to report positions for one or more vehicles'}), 403
+
+    now = datetime.datetime.utcnow()
+    oldest = now - datetime.timedelta(days=current_app.config['TELEMETRY_TTL_DAYS'])
+    newest = now + datetime.timedelta(seconds=current_app.config['TELEMETRY_MAX_FUTURE_SECONDS'])
+    docs, latest, rejected = [], {}, 0
+    for vehicle_id, batch in zip(vehicle_ids, batches):
+        for point in batch['positions']:
+            doc = parse_position(vehicle_id, point, oldest, newest)
+            if doc is None:
+                rejected += 1
+                continue
+            docs.append(doc)
+            if vehicle_id not in latest or doc['ts'] > latest[vehicle_id]['ts']:
+                latest[vehicle_id] = doc
+
+    if docs:
+        # Losing a few pings on failover is fine; don't wait for majority acknowledgement on the hot path
+        telemetry_collection.with_options(write_concern=WriteConcern(w=1)).insert_many(docs, ordered=False)
+        # Batches can arrive out of order: only move last_position forward in time. updated_at is left
+        # alone: a moving tractor would otherwise change every list ETag and ?since= delta it appears in
+        vehicles_collection.bulk_write([
+            UpdateOne(
+                {'_id': vehicle_id, 'last_position.ts': {'$not': {'$gte': doc['ts']}}},
+                {'$set': {'last_position': {k: v for k, v in doc.items() if k not in ('_id', 'vehicle_id')}}}
+            )
+            for vehicle_id, doc in latest.items()
+        ], ordered=False)
+        # last_position is part of the vehicle detail; the catalogue pages may lag by up to VEHICLE_CACHE_TTL
+        vehicle_cache.delete(*[vehicle_key(vehicle_id) for vehicle_id in latest])
+    return jsonify({'accepted': len(docs), 'rejected': rejected}), 201
+
+@bp.route('/vehicles/<vehicle_id>/track', methods=['GET'])
+@token_required
+def get_vehicle_track(current_user, vehicle_id):
+    """
+    A vehicle's path between ?from= and ?to= (default: the last 24 hours), downsampled
+    server-side into at most ?points= time buckets. Each bucket reports its last position.
+    """
+    # current_user is already converted to JSON-safe dict by token_required
+    try:
+        obj_id = ObjectId(vehicle_id)
+    except Exception:
+        return jsonify({'message': 'Invalid vehicle ID format'}), 400
+    if obj_id not in trackable_vehicle_ids(current_user, [obj_id]):
+        return jsonify({'message': 'Unauthorized to view this vehicle'}), 403
+
+    try:
+        end = parse_timestamp(request.args['to']) if 'to' in request.args else datetime.datetime.utcnow()
+        start = parse_timestamp(request.args['from']) if 'from' in request.args else end - datetime.timedelta(hours=24)
+        max_points = int(request.args.get('points', current_app.config['TRACK_MAX_POINTS']))
+    except (TypeError, ValueError, OverflowError, OSError):
+        return jsonify({'message': 'Invalid from, to or points parameter'}), 400
+    if start >= end:
+        return jsonify({'message': '"from" must be before "to"'}), 400
+    if end - start > datetime.timedelta(hours=current_app.config['TRACK_MAX_HOURS']):
+        return jsonify({'message': f"Track window is limited to {current_app.config['TRACK_MAX_HOURS']} hours"}), 400
+    max_points = min(max(max_points, 2), current_app.config['TRACK_MAX_POINTS'])
+
+    # Bucket width in ms so the window splits into at most max_points buckets
+    bucket_ms = max(1000, math.ceil((end - start).total_seconds() * 1000 / max_points))
+    pipeline = [
+        {'$match': {'vehicle_id': obj_id, 'ts': {'$gte': start, '$lt': end}}},
+        {'$sort': {'ts': 1}},
+        {'$group': {
+            '_id': {'$floor': {'$divide': [{'$subtract': ['$ts', start]}, bucket_ms]}},
+            'ts': {'$last': '$ts'},
+            'latitude': {'$last': '$latitude'},
+            'longitude': {'$last': '$longitude'},
+            'speed': {'$max': '$speed'},
+            'samples': {'$sum': 1}
+        }},
+        {'$sort': {'_id': 1}},
+        {'$project': {'_id': 0}}
+    ]
+    points = list(telemetry_collection.aggregate(pipeline))
+    return jsonify({
+        'vehicle_id': vehicle_id,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'bucket_seconds': bucket_ms / 1000,
+        'points': to_json(points)
+    })
+
+# --- Booking Denormalization ---
+
+# Compact copies stored on each booking so the owner's booking list needs no joins
+BOOKING_VEHICLE_FIELDS = ['vehicle_name', 'model', 'type', 'rent_price', 'image1_url']
+BOOKING_RENTER_FIELDS = ['username', 'fullname', 'phone', 'address']
+
+def vehicle_summary(vehicle):
+    summary = {k: vehicle.get(k) for k in BOOKING_VEHICLE_FIELDS}
+    summary['_id'] = vehicle['_id']
+    return summary
+
+def renter_summary(user):
+    summary = {k: user.get(k) for k in BOOKING_RENTER_FIELDS}
+    summary['_id'] = ObjectId(user['_id'])
+    return summary
+
+def refresh_booking_summaries(id_field, obj_id, summary_field, fields, update_data):
+    """Copy changed fields into the summaries stored on the matching bookings."""
+    changed = {f'{summary_field}.{k}': v for k, v in update_data.items() if k in fields}
+    if changed:
+        changed['updated_at'] = datetime.datetime.utcnow()
+        bookings_collection.update_many({id_field: obj_id}, {'$set': changed})
+
+# --- Owner Dashboard Counters ---
+
+# Per-owner counters kept in owner_stats so the dashboard is a single _id read.
+OWNER_STAT_FIELDS = ['vehicles', 'available_vehicles', 'pending_requests', 'active_rentals', 'completed_rentals', 'earnings']
+
+# Counter changes for each booking status move: (old status, new status) -> deltas.
+# 'amount' stands for the booking's amount; confirmed and completed bookings count as earnings.
+BOOKING_STAT_DELTAS = {
+    (None, 'pending'): {'pending_requests': 1},
+    ('pending', 'confirmed'): {'pending_requests': -1, 'active_rentals': 1, 'available_vehicles': -1, 'earnings': 'amount'},
+    ('pending', 'cancelled'): {'pending_requests': -1},
+    ('confirmed', 'cancelled'): {'active_rentals': -1, 'available_vehicles': 1, 'earnings': '-amount'},
+    ('confirmed', 'completed'): {'active_rentals': -1, 'completed_rentals': 1, 'available_vehicles': 1},
+}
+
+def booking_amount(rent_price, start_time, end_time):
+    """Price of a booking: the daily rent for every started day."""
+    days = max(1, math.ceil((end_time - start_time).total_seconds() / 86400))
+    return round(rent_price * days, 2)
+
+def bump_owner_stats(owner_id, deltas, session=None):
+    """
+    Apply counter deltas to an owner's summary. Owners without a summary yet are
+    skipped; their first GET /owner/summary computes it from scratch.
+    """
+    deltas = {k: v for k, v in deltas.items() if v}
+    if owner_id and deltas:
+        owner_stats_collection.update_one({'_id': owner_id}, {'$inc': deltas}, session=session)
+
+def booking_stat_deltas(booking, old_status, new_status):
+    """The BOOKING_STAT_DELTAS entry for a booking's status move, with 'amount' resolved."""
+    amount = booking.get('amount', 0)
+    deltas = {}
+    for field, delta in BOOKING_STAT_DELTAS.get((old_status, new_status), {}).items():
+        deltas[field] = amount if delta == 'amount' else -amount if delta == '-amount' else delta
+    return deltas
+
+def bump_booking_stats(booking, old_status, new_status, session=None):
+    """Apply the BOOKING_STAT_DELTAS entry for a booking's status move."""
+    bump_owner_stats(booking.get('owner_id'), booking_stat_deltas(booking, old_status, new_status), session)
+
+def bump_bookings_stats(bookings, new_status, session=None, exclude=()):
+    """
+    Apply the counter deltas of moving many bookings (as read before the move) to
+    new_status, with one update per owner instead of one per booking.
+    """
+    owner_deltas = {}
+    for booking in bookings:
+        totals = owner_deltas.setdefault(booking.get('owner_id'), {})
+        for field, delta in booking_stat_deltas(booking, booking['status'], new_status).items():
+            if field not in exclude:
+                totals[field] = totals.get(field, 0) + delta
+    for owner_id, deltas in owner_deltas.items():
+        bump_owner_stats(owner_id, deltas, session)
+
+def compute_owner_summary(owner_id):
+    """
+    Rebuild an owner's counters from scratch: one $group over the owner's vehicles
+    and one per booking collection (live and archived), each on an owner_id index.
+    """
+    vehicle_counts = next(vehicles_collection.aggregate([
+        {'$match': {'owner_id': owner_id}},
+        {'$group': {
+            '_id': None,
+            'total': {'$sum': 1},
+            'available': {'$sum': {'$cond': [{'$eq': ['$availability', False]}, 0, 1]}}
+        }}
+    ]), {})
+    by_status = {}
+    for collection in (bookings_collection, bookings_archive_collection):
+        for group in collection.aggregate([
+            {'$match': {'owner_id': owner_id}},
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}, 'amount': {'$sum': {'$ifNull': ['$amount', 0]}}}}
+        ]):
+            totals = by_status.setdefault(group['_id'], {'count': 0, 'amount': 0})
+            totals['count'] += group['count']
+            totals['amount'] += group['amount']
+    return {
+        'vehicles': vehicle_counts.get('total', 0),
+        'available_vehicles': vehicle_counts.get('available', 0),
+        'pending_requests': by_status.get('pending', {}).get('count', 0),
+        'active_rentals': by_status.get('confirmed', {}).get('count', 0),
+        'completed_rentals': by_status.get('completed', {}).get('count', 0),
+        'earnings': round(sum(by_status.get(s, {}).get('amount', 0) for s in ['confirmed', 'completed']), 2)
+    }
+
+def rebuild_owner_stats(owner_id):
+    """Recompute an owner's counters and store them."""
+    summary = compute_owner_summary(owner_id)
+    summary['computed_at'] = datetime.datetime.utcnow()
+    owner_stats_collection.replace_one({'_id': owner_id}, summary, upsert=True)
+    return summary
+
+# --- Booking State Machine ---
+
+# (role, new status) -> (statuses the booking may move from, success message)
+BOOKING_TRANSITIONS = {
+    ('owner', 'confirmed'): (['pending'], 'Booking confirmed successfully!'),
+    ('owner', 'cancelled'): (BLOCKING_STATUSES, 'Booking cancelled by owner.'),
+    ('owner', 'completed'): (['confirmed'], 'Booking marked as completed.'),
+    ('renter', 'cancelled'): (BLOCKING_STATUSES, 'Booking cancelled by renter.'),
+}
+
+def run_transaction(callback):
+    """
+    Run callback(session) inside a transaction when the deployment supports one,
+    otherwise run it with session=None. Callbacks compensate their own partial
+    writes, so they stay correct either way; the transaction adds isolation.
+    """
+    if mongo.supports_transactions():
+        with mongo.client.start_session() as session:
+            return session.with_transaction(callback)
+    return callback(None)
+
+def booking_guard(current_user):
+    """Filter that limits a booking write to rows the current user may touch."""
+    user_obj_id = ObjectId(current_user['_id'])
+    if current_user['role'] == 'owner':
+        return {'owner_id': user_obj_id}
+    return {'renter_id': user_obj_id}
+
+def transition_failure(booking_obj_id, current_user, new_status):
+    """
+    Explain why a guarded transition matched nothing. Only runs on the failure path.
+    Returns (message, status_code), or None when a legacy booking just needed its owner_id.
+    """
+    booking = bookings_collection.find_one({'_id': booking_obj_id})
+    if not booking:
+        return 'Booking not found', 404
+
+    user_obj_id = ObjectId(current_user['_id'])
+    if current_user['role'] == 'owner':
+        if 'owner_id' not in booking:
+            # Booking created before owner_id was stored on bookings: resolve it once and retry
+            vehicle = vehicles_collection.find_one({'_id': booking['vehicle_id']}, {'owner_id': 1})
+            if vehicle and vehicle['owner_id'] == user_obj_id:
+                bookings_collection.update_one({'_id': booking_obj_id}, {'$set': {'owner_id': user_obj_id}})
+                return None
+        if booking.get('owner_id') != user_obj_id:
+            return 'Unauthorized: Not the owner of this vehicle', 403
+    elif booking['renter_id'] != user_obj_id:
+        return 'Unauthorized: Not your booking', 403
+
+    if new_status == 'confirmed':
+        return 'Only pending bookings can be confirmed.', 400
+    if new_status == 'completed':
+        return 'Only confirmed bookings can be marked as completed.', 400
+    return 'Cannot cancel a booking that is already cancelled or completed.', 400
+
+def transition_booking(booking_obj_id, current_user, new_status):
+    """
+    Apply one booking state transition. The status guard lives in the filter of a
+    single find_one_and_update, so two parallel requests can never both win it.
+    The vehicle availability flip follows in the same transaction; if the vehicle
+    cannot be claimed the booking is moved back. Returns (message, status_code).
+    """
+    from_statuses, success_message = BOOKING_TRANSITIONS[(current_user['role'], new_status)]
+    applied = {} # What the winning attempt changed, for the events sent after commit
+
+    def callback(session):
+        now = datetime.datetime.utcnow()
+        booking = bookings_collection.find_one_and_update(
+            {'_id': booking_obj_id, 'status': {'$in': from_statuses}, **booking_guard(current_user)},
+            {'$set': {'status': new_status, 'updated_at': now}},
+            projection={'vehicle_id': 1, 'status': 1, 'owner_id': 1, 'renter_id': 1, 'amount': 1},
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+        if not booking:
+            return None
+        applied['booking'], applied['availability'] = booking, None
+
+        if new_status == 'confirmed':
+            claimed = vehicles_collection.update_one(
+                {'_id': booking['vehicle_id'], 'availability': {'$ne': False}},
+                {'$set': {'availability': False, 'updated_at': now}}, # Make vehicle unavailable
+                session=session
+            )
+            if not claimed.matched_count:
+                # Another booking holds the vehicle: put this one back to pending
+                rolled_back = bookings_collection.update_one(
+                    {'_id': booking_obj_id, 'status': 'confirmed'},
+                    {'$set': {'status': booking['status'], 'updated_at': now}},
+                    session=session
+                )
+                if not rolled_back.matched_count:
+                    # A cancel saw it confirmed meanwhile and counted a move from confirmed: count ours so they net out
+                    bump_booking_stats(booking, booking['status'], new_status, session)
+                return 'Vehicle is no longer available to confirm this booking.', 400
+            applied['availability'] = False
+            if session is None and not bookings_collection.count_documents({'_id': booking_obj_id, 'status': 'confirmed'}):
+                # Without a transaction a cancel can land between the status write and the claim. It
+                # released the vehicle before we took it, so give it back and report the lost race.
+                vehicles_collection.update_one(
+                    {'_id': booking['vehicle_id']}, {'$set': {'availability': True, 'updated_at': now}}
+                )
+                applied['availability'] = True
+                bump_booking_stats(booking, booking['status'], new_status)
+                return 'Booking was changed while it was being confirmed.', 409
+        elif booking['status'] == 'confirmed':
+            # Cancelling or completing a confirmed booking frees the vehicle again
+            vehicles_collection.update_one(
+                {'_id': booking['vehicle_id']}, {'$set': {'availability': True, 'updated_at': now}}, session=session
+            )
+            applied['availability'] = True
+        bump_booking_stats(booking, booking['status'], new_status, session)
+        return success_message, 200
+
+    result = run_transaction(callback)
+    if result is None:
+        failure = transition_failure(booking_obj_id, current_user, new_status)
+        if failure:
+            return failure
+        # A legacy booking just got its owner_id; the guarded write can now match
+        result = run_transaction(callback) or transition_failure(booking_obj_id, current_user, new_status)
+    if applied.get('availability') is not None:
+        invalidate_vehicle_caches(applied['booking']['vehicle_id'])
+    if result and result[1] == 200:
+        booking = applied['booking']
+        publish_event('booking.updated', booking_obj_id, event_audience(booking.get('owner_id'), booking.get('renter_id')),
+                      status=new_status, previous_status=booking['status'], vehicle_id=booking['vehicle_id'])
+        if applied['availability'] is not None:
+            publish_event('vehicle.updated', booking['vehicle_id'], event_audience(booking.get('owner_id'), renters=True),
+                          fields=['availability'], availability=applied['availability'])
+    return result or ('Unauthorized action or invalid request.', 403)
+
+def insert_booking(new_booking, session=None):
+    """
+    Insert a booking, then verify nothing else overlaps it. Checking after the
+    insert means that of two racing requests the later one always sees the other
+    and backs out, so overlapping bookings are never both kept. Inside a
+    transaction, bumping the vehicle first also serializes concurrent bookers.
+    Returns True if the booking was kept.
+    """
+    if session is not None:
+        vehicles_collection.update_one(
+            {'_id': new_booking['vehicle_id']},
+            {'$inc': {'booking_seq': 1}}, # A write conflict is all we need: no updated_at, the listing is unchanged
+            session=session
+        )
+    inserted_id = bookings_collection.insert_one(new_booking, session=session).inserted_id
+    overlapping_bookings = bookings_collection.count_documents({
+        '_id': {'$ne': inserted_id},
+        'vehicle_id': new_booking['vehicle_id'],
+        'status': {'$in': BLOCKING_STATUSES},
+        'start_time': {'$lt': new_booking['end_time']},
+        'end_time': {'$gt': new_booking['start_time']}
+    }, session=session)
+    if overlapping_bookings > 0:
+        bookings_collection.delete_one({'_id': inserted_id}, session=session)
+        if session is None: # Without a transaction the insert was briefly visible to ?since= readers
+            record_tombstone('bookings', inserted_id, owner_id=new_booking['owner_id'], renter_id=new_booking['renter_id'])
+        return False
+    return True
+
 # --- Booking Routes (CRUD) ---
 
-@app.route('/bookings', methods=['POST'])
+@bp.route('/bookings', methods=['POST'])
 @token_required
 @role_required('renter')
 def create_booking(current_user):
@@ -377,154 +2839,722 @@ def create_booking(current_user):
 
     # Basic time validation (can be expanded with more robust checks)
     try:
-        start_time = datetime.datetime.fromisoformat(data['start_time'])
-        end_time = datetime.datetime.fromisoformat(data['end_time'])
+        start_time = parse_timestamp(data['start_time']) # Naive UTC, like the availability query
+        end_time = parse_timestamp(data['end_time'])
         if start_time >= end_time:
             return jsonify({'message': 'Start time must be before end time'}), 400
         if start_time < datetime.datetime.utcnow():
             return jsonify({'message': 'Cannot book in the past'}), 400
-    except ValueError:
+    except (TypeError, ValueError, OverflowError, OSError):
         return jsonify({'message': 'Invalid date/time format. Use ISO format (YYYY-MM-DDTHH:MM:SS)'}), 400
 
-    # Check for overlapping bookings for the same vehicle
-    overlapping_bookings = bookings_collection.count_documents({
-        'vehicle_id': vehicle_obj_id,
-        'status': {'$in': ['pending', 'confirmed']},
-        '$or': [
-            {'start_time': {'$lt': end_time}, 'end_time': {'$gt': start_time}}
-        ]
-    })
-    if overlapping_bookings > 0:
-        return jsonify({'message': 'Vehicle is already booked during this period.'}), 409
-
-
     new_booking = {
         'renter_id': ObjectId(current_user['_id']), # Convert back to ObjectId for DB storage
         'vehicle_id': vehicle_obj_id,
+        'owner_id': vehicle['owner_id'], # Lets owner queries and transitions skip the vehicle lookup
+        'vehicle_details': vehicle_summary(vehicle),
+        'renter_details': renter_summary(current_user),
         'start_time': start_time,
         'end_time': end_time,
         'status': 'pending', # Statuses: pending, confirmed, cancelled, completed
+        'amount': booking_amount(vehicle['rent_price'], start_time, end_time),
         'created_at': datetime.datetime.utcnow()
     }
-    bookings_collection.insert_one(new_booking)
+    new_booking['updated_at'] = new_booking['created_at']
+    if not run_transaction(lambda session: insert_booking(new_booking, session)):
+        return jsonify({'message': 'Vehicle is already booked during this period.'}), 409
+    bump_booking_stats(new_booking, None, 'pending')
+    publish_event('booking.created', new_booking['_id'], event_audience(new_booking['owner_id'], new_booking['renter_id']),
+                  status='pending', vehicle_id=vehicle_obj_id)
     return jsonify({'message': 'Booking request sent successfully! Waiting for owner confirmation.'}), 201
 
-@app.route('/bookings', methods=['GET'])
+@bp.route('/bookings', methods=['GET'])
 @token_required
 def get_bookings(current_user):
-    """Get bookings. Renters see their own, owners see bookings for their vehicles."""
+    """
+    Get bookings. Renters see their own, owners see bookings for their vehicles.
+    Supports ?limit=&after= keyset pagination, a ?fields= sparse fieldset and ?since= delta sync.
+    """
     # current_user is already converted to JSON-safe dict by token_required
-    if current_user['role'] == 'renter':
-        pipeline = [
-            {'$match': {'renter_id': ObjectId(current_user['_id'])}}, # Match using ObjectId
-            {'$lookup': {
-                'from': 'vehicles',
-                'localField': 'vehicle_id',
-                'foreignField': '_id',
-                'as': 'vehicle_details'
-            }},
-            {'$unwind': '$vehicle_details'},
-            {'$project': {'vehicle_details.owner_id': 0}} # Exclude owner_id from vehicle_details
-        ]
-        bookings = list(bookings_collection.aggregate(pipeline))
-    else: # Owner
-        owner_vehicles = list(vehicles_collection.find({'owner_id': ObjectId(current_user['_id'])}, {'_id': 1}))
-        owner_vehicle_ids = [v['_id'] for v in owner_vehicles]
-        
-        if not owner_vehicle_ids:
-            return jsonify(to_json([])), 200 # Owner has no vehicles, thus no bookings for them
-
-        pipeline = [
-            {'$match': {'vehicle_id': {'$in': owner_vehicle_ids}}},
-            {'$lookup': {
-                'from': 'users',
-                'localField': 'renter_id',
-                'foreignField': '_id',
-                'as': 'renter_details'
-            }},
-            {'$unwind': '$renter_details'},
-            {'$lookup': {
-                'from': 'vehicles',
-                'localField': 'vehicle_id',
-                'foreignField': '_id',
-                'as': 'vehicle_details'
-            }},
-            {'$unwind': '$vehicle_details'},
-            {'$project': {
-                'renter_details.password': 0, # Exclude renter's password
-                'vehicle_details.owner_id': 0 # Exclude owner_id from vehicle_details
-            }} 
-        ]
-        bookings = list(bookings_collection.aggregate(pipeline))
-
-    return jsonify(to_json(bookings))
-
-@app.route('/bookings/<booking_id>', methods=['PUT'])
+    try:
+        limit, keyset_filter, projection = parse_list_args(BOOKING_LIST_FIELDS)
+        since = parse_since()
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    user_field = 'owner_id' if current_user['role'] == 'owner' else 'renter_id'
+    query = {user_field: ObjectId(current_user['_id'])}
+    tombstone_filter = {'collection': 'bookings', user_field: query[user_field]}
+    joined, etag = None, None
+    if current_user['role'] == 'renter' and (since or not limit):
+        # Renters get each vehicle joined in at read time, so a vehicle write changes their list too
+        joined = (vehicles_collection, {'_id': {'$in': bookings_collection.distinct('vehicle_id', query)}})
+    if since:
+        changed = changed_since(query, since)
+        if joined:
+            changed_vehicles = joined[0].distinct('_id', changed_since(joined[1], since))
+            changed = {'$or': [changed, {**query, 'vehicle_id': {'$in': changed_vehicles}}]}
+        query = changed
+    elif not limit: # Pages tag their own body in page_response, joined vehicles included
+        etag = list_etag(bookings_collection, query, current_user, joined)
+        if request.if_none_match.contains_weak(etag):
+            return not_modified(etag)
+
+    if current_user['role'] == 'owner':
+        # owner_id and renter/vehicle summaries live on each booking: one indexed range scan, no joins
+        if since:
+            return delta_response(bookings_collection.find(query, projection), since, tombstone_filter)
+        if keyset_filter:
+            query = {'$and': [query, keyset_filter]}
+        bookings = bookings_collection.find(query, projection).sort(PAGE_SORT)
+        if limit:
+            bookings = bookings.limit(limit + 1)
+        response = page_response(bookings.batch_size(current_app.config['STREAM_BATCH_SIZE']), limit)
+        if etag:
+            response.set_etag(etag)
+        return response
+
+    # Page through the bookings before the $lookup so the join only runs for rows we return
+    page_stages = []
+    if keyset_filter:
+        page_stages.append({'$match': keyset_filter})
+    page_stages.append({'$sort': dict(PAGE_SORT)})
+    if limit:
+        page_stages.append({'$limit': limit + 1})
+
+    # Renters get the full, current vehicle document
+    pipeline = [
+        {'$match': query}, # Match using ObjectId
+        *([] if since else page_stages),
+        {'$lookup': {
+            'from': 'vehicles',
+            'localField': 'vehicle_id',
+            'foreignField': '_id',
+            'as': 'vehicle_details'
+        }},
+        {'$unwind': '$vehicle_details'},
+        {'$project': {'vehicle_details.owner_id': 0, 'renter_details': 0}} # Exclude owner_id and the renter's own summary
+    ]
+    if projection:
+        pipeline.append({'$project': projection})
+    bookings = bookings_collection.aggregate(pipeline, batchSize=current_app.config['STREAM_BATCH_SIZE'])
+    if since:
+        return delta_response(bookings, since, tombstone_filter)
+    response = page_response(bookings, limit)
+    if etag:
+        response.set_etag(etag)
+    return response
+
+@bp.route('/bookings/<booking_id>', methods=['PUT'])
 @token_required
 def update_booking_status(current_user, booking_id):
-    """Update booking status. Owner can confirm/cancel, renter can cancel."""
+    """Update booking status. Owner can confirm/cancel/complete, renter can cancel."""
     # current_user is already converted to JSON-safe dict by token_required
     try:
         booking_obj_id = ObjectId(booking_id)
     except Exception:
         return jsonify({'message': 'Invalid booking ID format'}), 400
 
-    booking = bookings_collection.find_one({'_id': booking_obj_id})
-    if not booking:
-        return jsonify({'message': 'Booking not found'}), 404
-
     data = request.get_json()
     new_status = data.get('status')
     if not new_status or new_status not in ['confirmed', 'cancelled', 'completed']:
         return jsonify({'message': 'Invalid status. Must be "confirmed", "cancelled", or "completed".'}), 400
 
-    if current_user['role'] == 'owner':
-        vehicle = vehicles_collection.find_one({'_id': booking['vehicle_id']})
-        if not vehicle or vehicle['owner_id'] != ObjectId(current_user['_id']):
-            return jsonify({'message': 'Unauthorized: Not the owner of this vehicle'}), 403
-        
-        # Owner can set confirmed, cancelled, completed
-        if new_status == 'confirmed':
-            # Check for availability if confirming (prevent double booking in a small race condition)
-            if not vehicle.get('availability', True):
-                 return jsonify({'message': 'Vehicle is no longer available to confirm this booking.'}), 400
-            
-            bookings_collection.update_one({'_id': booking_obj_id}, {'$set': {'status': 'confirmed'}})
-            vehicles_collection.update_one({'_id': booking['vehicle_id']}, {'$set': {'availability': False}}) # Make vehicle unavailable
-            return jsonify({'message': 'Booking confirmed successfully!'})
-        
-        elif new_status == 'cancelled':
-            bookings_collection.update_one({'_id': booking_obj_id}, {'$set': {'status': 'cancelled'}})
-            # If the booking was previously confirmed, make the vehicle available again
-            if booking['status'] == 'confirmed':
-                vehicles_collection.update_one({'_id': booking['vehicle_id']}, {'$set': {'availability': True}})
-            return jsonify({'message': 'Booking cancelled by owner.'})
-        
-        elif new_status == 'completed':
-            if booking['status'] != 'confirmed':
-                return jsonify({'message': 'Only confirmed bookings can be marked as completed.'}), 400
-            bookings_collection.update_one({'_id': booking_obj_id}, {'$set': {'status': 'completed'}})
-            vehicles_collection.update_one({'_id': booking['vehicle_id']}, {'$set': {'availability': True}}) # Make vehicle available again after completion
-            return jsonify({'message': 'Booking marked as completed.'})
-
-    elif current_user['role'] == 'renter':
-        if booking['renter_id'] != ObjectId(current_user['_id']):
-            return jsonify({'message': 'Unauthorized: Not your booking'}), 403
-        
-        # Renters can only cancel their own pending/confirmed bookings
-        if new_status == 'cancelled':
-            if booking['status'] in ['pending', 'confirmed']:
-                bookings_collection.update_one({'_id': booking_obj_id}, {'$set': {'status': 'cancelled'}})
-                # If the booking was confirmed, make the vehicle available again
-                if booking['status'] == 'confirmed':
-                    vehicles_collection.update_one({'_id': booking['vehicle_id']}, {'$set': {'availability': True}})
-                return jsonify({'message': 'Booking cancelled by renter.'})
-            else:
-                return jsonify({'message': 'Cannot cancel a booking that is already cancelled or completed.'}), 400
+    if current_user['role'] == 'renter' and new_status != 'cancelled':
+        return jsonify({'message': 'Renters can only cancel bookings.'}), 403
+    if (current_user['role'], new_status) not in BOOKING_TRANSITIONS:
+        return jsonify({'message': 'Unauthorized action or invalid request.'}), 403
+
+    message, status_code = transition_booking(booking_obj_id, current_user, new_status)
+    return jsonify({'message': message}), status_code
+
+@bp.route('/bookings/bulk-status', methods=['POST'])
+@token_required
+def update_bookings_status_bulk(current_user):
+    """
+    Move many bookings to one status, e.g. an owner completing a season's rentals.
+    Body: {"status": "completed" | "cancelled", "booking_ids": [...]}. The guarded updates
+    go out as a single bulk_write; the response has a result per booking ID.
+    Confirming stays on PUT /bookings/<id> because it must claim the vehicle first.
+    """
+    # current_user is already converted to JSON-safe dict by token_required
+    data = request.get_json(silent=True) or {}
+    new_status = data.get('status')
+    booking_ids = data.get('booking_ids')
+    if new_status not in ['cancelled', 'completed']:
+        return jsonify({'message': 'Invalid status. Must be "cancelled" or "completed".'}), 400
+    if (current_user['role'], new_status) not in BOOKING_TRANSITIONS:
+        return jsonify({'message': 'Unauthorized action or invalid request.'}), 403
+    if not isinstance(booking_ids, list) or not booking_ids:
+        return jsonify({'message': 'booking_ids must be a non-empty list'}), 400
+    if len(booking_ids) > current_app.config['BULK_STATUS_MAX_ITEMS']:
+        return jsonify({'message': f"At most {current_app.config['BULK_STATUS_MAX_ITEMS']} bookings per request"}), 413
+
+    results = {}
+    obj_ids = []
+    for booking_id in booking_ids:
+        try:
+            obj_ids.append(ObjectId(booking_id))
+        except Exception:
+            results[str(booking_id)] = {'status': 'error', 'message': 'Invalid booking ID format'}
+    obj_ids = list(dict.fromkeys(obj_ids))
+    from_statuses, success_message = BOOKING_TRANSITIONS[(current_user['role'], new_status)]
+    guard = booking_guard(current_user)
+    applied = {}
+
+    def callback(session):
+        now = datetime.datetime.utcnow()
+        op_id = ObjectId() # Marks the rows this request moves; updated_at only has millisecond precision
+        applied.clear()
+        # One read tells us each booking's current status, then one bulk_write moves them
+        current = {b['_id']: b for b in bookings_collection.find(
+            {'_id': {'$in': obj_ids}, **guard},
+            {'vehicle_id': 1, 'status': 1, 'owner_id': 1, 'renter_id': 1, 'amount': 1},
+            session=session
+        )}
+        movable = [b for b in current.values() if b['status'] in from_statuses]
+        if movable:
+            bookings_collection.bulk_write([
+                UpdateOne({'_id': b['_id'], 'status': b['status'], **guard},
+                          {'$set': {'status': new_status, 'updated_at': now, 'op_id': op_id}})
+                for b in movable
+            ], ordered=False, session=session)
+            moved = set(bookings_collection.distinct(
+                '_id', {'_id': {'$in': [b['_id'] for b in movable]}, 'op_id': op_id}, session=session
+            ))
+        else:
+            moved = set()
+        for booking in current.values():
+            if booking['_id'] in moved:
+                applied[booking['_id']] = booking
+        # vehicle -> owner for every vehicle a confirmed booking held
+        released = {b['vehicle_id']: b.get('owner_id') for b in applied.values() if b['status'] == 'confirmed'}
+        if released:
+            # Cancelling or completing a confirmed booking frees the vehicle again
+            vehicles_collection.update_many(
+                {'_id': {'$in': list(released)}}, {'$set': {'availability': True, 'updated_at': now}}, session=session
+            )
+        bump_bookings_stats(applied.values(), new_status, session)
+        return current, released
+
+    current, released = run_transaction(callback)
+    for obj_id in obj_ids:
+        if obj_id in applied:
+            results[str(obj_id)] = {'status': 'ok', 'message': success_message}
+        elif obj_id not in current:
+            results[str(obj_id)] = {'status': 'error', 'message': 'Booking not found'}
+        elif current[obj_id]['status'] not in from_statuses:
+            results[str(obj_id)] = {'status': 'error', 'message': f"Cannot move a {current[obj_id]['status']} booking to {new_status}."}
         else:
-            return jsonify({'message': 'Renters can only cancel bookings.'}), 403
+            results[str(obj_id)] = {'status': 'error', 'message': 'Booking changed while updating, try again.'}
+
+    if released:
+        invalidate_vehicle_caches(*released)
+    publish_events(
+        [('booking.updated', b['_id'], event_audience(b.get('owner_id'), b.get('renter_id')),
+          {'status': new_status, 'previous_status': b['status'], 'vehicle_id': b['vehicle_id']}) for b in applied.values()] +
+        [('vehicle.updated', vehicle_id, event_audience(owner_id, renters=True),
+          {'fields': ['availability'], 'availability': True}) for vehicle_id, owner_id in released.items()]
+    )
+    return jsonify({'updated': len(applied), 'results': results})
+
+# --- Booking Lifecycle Sweep ---
+
+def move_bookings(query, from_status, new_status, limit, extra=None):
+    """
+    Move up to `limit` bookings matching `query` from one status to another with a
+    single guarded bulk_write and update the owner counters, except
+    available_vehicles: recompute_availability settles that from what it changes.
+    Returns the moved bookings as they were before the move.
+    """
+    def callback(session):
+        now = datetime.datetime.utcnow()
+        op_id = ObjectId() # Marks the rows this sweep moves; updated_at only has millisecond precision
+        found = list(bookings_collection.find(
+            {**query, 'status': from_status},
+            {'vehicle_id': 1, 'status': 1, 'owner_id': 1, 'renter_id': 1, 'amount': 1},
+            session=session
+        ).limit(limit))
+        if not found:
+            return []
+        bookings_collection.bulk_write([
+            UpdateOne({'_id': b['_id'], 'status': from_status},
+                      {'$set': {'status': new_status, 'updated_at': now, 'op_id': op_id, **(extra or {})}})
+            for b in found
+        ], ordered=False, session=session)
+        # Only the rows carrying op_id were moved by this sweep; a user may have won the others
+        moved = set(bookings_collection.distinct(
+            '_id', {'_id': {'$in': [b['_id'] for b in found]}, 'op_id': op_id}, session=session
+        ))
+        applied = [b for b in found if b['_id'] in moved]
+        bump_bookings_stats(applied, new_status, session, exclude=['available_vehicles'])
+        return applied
+
+    return run_transaction(callback)
+
+def recompute_availability(vehicle_ids, batch_size):
+    """
+    Set each vehicle's availability from its bookings: held while a confirmed booking
+    exists, free otherwise. Only wrong rows are written, in one bulk_write per batch,
+    each guarded on the availability and updated_at we read so a booking confirmed
+    meanwhile is never overwritten. Returns {vehicle_id: (owner_id, availability)}.
+    """
+    vehicle_ids = list(vehicle_ids)
+    changed = {}
+    for i in range(0, len(vehicle_ids), batch_size):
+        chunk = vehicle_ids[i:i + batch_size]
+        held = set(bookings_collection.distinct('vehicle_id', {'vehicle_id': {'$in': chunk}, 'status': 'confirmed'}))
+        now = datetime.datetime.utcnow()
+        op_id = ObjectId() # Marks the rows this batch changes; updated_at only has millisecond precision
+        requests, wanted = [], {}
+        for vehicle in vehicles_collection.find({'_id': {'$in': chunk}}, {'owner_id': 1, 'availability': 1, 'updated_at': 1}):
+            available = vehicle['_id'] not in held
+            if (vehicle.get('availability', True) is not False) == available:
+                continue
+            requests.append(UpdateOne(
+                {'_id': vehicle['_id'], 'availability': {'$ne': False} if available is False else False,
+                 'updated_at': vehicle.get('updated_at')},
+                {'$set': {'availability': available, 'updated_at': now, 'op_id': op_id}}
+            ))
+            wanted[vehicle['_id']] = (vehicle['owner_id'], available)
+        if not requests:
+            continue
+        vehicles_collection.bulk_write(requests, ordered=False)
+        for vehicle_id in vehicles_collection.distinct('_id', {'_id': {'$in': list(wanted)}, 'op_id': op_id}):
+            changed[vehicle_id] = wanted[vehicle_id]
+
+    owner_deltas = {}
+    for owner_id, available in changed.values():
+        owner_deltas[owner_id] = owner_deltas.get(owner_id, 0) + (1 if available else -1)
+    for owner_id, delta in owner_deltas.items():
+        bump_owner_stats(owner_id, {'available_vehicles': delta})
+    return changed
+
+def archive_bookings(cutoff, batch_size):
+    """
+    Move completed and cancelled bookings that ended before `cutoff` to
+    bookings_archive. Each batch is upserted into the archive and tombstoned before
+    it is deleted here, so an interrupted run just copies it again and ?since=
+    clients drop the moved bookings. Returns the number moved.
+    """
+    query = {'status': {'$in': ['completed', 'cancelled']}, 'end_time': {'$lt': cutoff}}
+    archived = 0
+    while True:
+        batch = list(bookings_collection.find(query).limit(batch_size))
+        if not batch:
+            break
+        now = datetime.datetime.utcnow()
+        bookings_archive_collection.bulk_write(
+            [ReplaceOne({'_id': b['_id']}, {**b, 'archived_at': now}, upsert=True) for b in batch], ordered=False
+        )
+        record_tombstones('bookings', batch, ['owner_id', 'renter_id']) # Finished bookings never change again
+        archived += bookings_collection.delete_many({'_id': {'$in': [b['_id'] for b in batch]}, **query}).deleted_count
+        if len(batch) < batch_size:
+            break
+    return archived
+
+def run_booking_sweep():
+    """
+    One pass of the booking lifecycle: cancel stale pending requests, complete
+    finished rentals, recompute availability of the vehicles they held (and of any
+    still listed although a confirmed booking holds them), then archive old finished
+    bookings. Every write is guarded, so overlapping runs are harmless. Returns counts.
+    """
+    config = current_app.config
+    batch_size = config['SCHEDULER_BATCH_SIZE']
+    now = datetime.datetime.utcnow()
+    report = {'expired': 0, 'completed': 0, 'availability_changed': 0, 'archived': 0}
+    released = set()
+
+    stale = {'$or': [
+        {'start_time': {'$lte': now}},
+        {'created_at': {'$lt': now - datetime.timedelta(hours=config['BOOKING_PENDING_TTL_HOURS'])}}
+    ]}
+    finished = {'end_time': {'$lte': now - datetime.timedelta(minutes=config['BOOKING_COMPLETE_GRACE_MINUTES'])}}
+    for counter, query, from_status, new_status, extra in [
+        ('expired', stale, 'pending', 'cancelled', {'cancel_reason': 'expired'}),
+        ('completed', finished, 'confirmed', 'completed', {'auto_completed': True}),
+    ]:
+        while True:
+            moved = move_bookings(query, from_status, new_status, batch_size, extra)
+            report[counter] += len(moved)
+            if from_status == 'confirmed':
+                released.update(b['vehicle_id'] for b in moved)
+            publish_events([
+                ('booking.updated', b['_id'], event_audience(b.get('owner_id'), b.get('renter_id')),
+                 {'status': new_status, 'previous_status': from_status, 'vehicle_id': b['vehicle_id']})
+                for b in moved
+            ])
+            if len(moved) < batch_size:
+                break
+
+    # Vehicles held by a confirmed booking but still listed, e.g. after a failed write
+    held = bookings_collection.distinct('vehicle_id', {'status': 'confirmed'})
+    released.update(vehicles_collection.distinct('_id', {'_id': {'$in': held}, 'availability': {'$ne': False}}))
+    changed = recompute_availability(released, batch_size)
+    report['availability_changed'] = len(changed)
+    if changed:
+        invalidate_vehicle_caches(*changed)
+        publish_events([
+            ('vehicle.updated', vehicle_id, event_audience(owner_id, renters=True),
+             {'fields': ['availability'], 'availability': available})
+            for vehicle_id, (owner_id, available) in changed.items()
+        ])
+
+    report['archived'] = archive_bookings(now - datetime.timedelta(days=config['BOOKING_ARCHIVE_AFTER_DAYS']), batch_size)
+    return report
 
-    return jsonify({'message': 'Unauthorized action or invalid request.'}), 403
+def acquire_lease(name, holder, seconds):
+    """Take or renew the named lease in the scheduler collection. Returns True if `holder` now has it."""
+    now = datetime.datetime.utcnow()
+    try:
+        scheduler_collection.find_one_and_update(
+            {'_id': name, '$or': [{'lease_until': {'$lt': now}}, {'holder': holder}]},
+            {'$set': {'holder': holder, 'lease_until': now + datetime.timedelta(seconds=seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError: # Held by someone else: the upsert collided with their document
+        return False
+
+class BookingScheduler:
+    """
+    Runs run_booking_sweep every SCHEDULER_INTERVAL seconds. With SCHEDULER_ENABLED
+    every worker process starts a thread on its first request, and a lease in the
+    scheduler collection lets one of them sweep per interval.
+    """
+    lease_name = 'booking-sweep'
+
+    def __init__(self):
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self, app):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid(): # First request in this process (or after a fork)
+                self._pid = os.getpid()
+                threading.Thread(target=self.run_forever, args=(app,), name='booking-sweep', daemon=True).start()
+
+    def run_forever(self, app):
+        holder = f'{socket.gethostname()}:{os.getpid()}'
+        while True:
+            interval = app.config['SCHEDULER_INTERVAL']
+            with app.app_context():
+                try:
+                    if acquire_lease(self.lease_name, holder, interval * 2):
+                        self.run_once()
+                except Exception: # Any failure skips one sweep, never the thread
+                    app.logger.exception('Booking sweep failed')
+            time.sleep(interval)
+
+    def run_once(self):
+        started = time.perf_counter()
+        report = run_booking_sweep()
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        scheduler_collection.update_one(
+            {'_id': self.lease_name}, {'$set': {'last_report': report, 'last_run_at': datetime.datetime.utcnow()}}, upsert=True
+        )
+        if any(report[k] for k in ['expired', 'completed', 'availability_changed', 'archived']):
+            current_app.logger.info('Booking sweep: %s', report)
+        return report
+
+booking_scheduler = AppLocal('booking_scheduler')
+
+@bp.before_app_request
+def start_booking_scheduler():
+    if current_app.config['SCHEDULER_ENABLED']:
+        booking_scheduler.ensure_started(current_app._get_current_object())
+
+# --- Owner Dashboard Routes ---
+
+@bp.route('/owner/summary', methods=['GET'])
+@token_required
+@role_required('owner')
+def get_owner_summary(current_user):
+    """
+    Dashboard counters for the current owner. Served from the owner_stats
+    document; computed from scratch (compute_owner_summary) the first time or on ?refresh=1.
+    """
+    owner_id = ObjectId(current_user['_id'])
+    summary = None
+    if request.args.get('refresh') not in ('1', 'true'):
+        summary = owner_stats_collection.find_one({'_id': owner_id})
+    if summary is None:
+        summary = rebuild_owner_stats(owner_id)
+    summary.pop('_id', None)
+    summary['earnings'] = round(summary.get('earnings', 0), 2)
+    return jsonify(to_json(summary))
+
+# --- Indexes ---
+
+def index_registry():
+    """Declarative index registry: collection name -> indexes every query path relies on."""
+    return {
+        'users': [
+            IndexModel([('username', ASCENDING)], unique=True, name='username_unique'),
+        ],
+        'vehicles': [
+            # Owner listing; the owner_id prefix also serves plain owner_id lookups
+            IndexModel([('owner_id', ASCENDING), ('created_at', DESCENDING)], name='owner_created'),
+            # Renter listing of available vehicles, newest first
+            IndexModel([('availability', ASCENDING), ('created_at', DESCENDING)], name='availability_created'),
+            # /vehicles/search: words in name/model, and type/price filters and price sorts over available vehicles
+            IndexModel([('vehicle_name', TEXT), ('model', TEXT)], name='name_model_text'),
+            IndexModel([('availability', ASCENDING), ('type', ASCENDING), ('rent_price', ASCENDING)], name='availability_type_price'),
+            IndexModel([('availability', ASCENDING), ('rent_price', ASCENDING)], name='availability_price'),
+            # GeoJSON copy of location for /vehicles/nearby
+            IndexModel([('geo', GEOSPHERE)], name='geo_2dsphere'),
+            # ?since= delta sync
+            IndexModel([('owner_id', ASCENDING), ('updated_at', ASCENDING)], name='owner_updated'),
+            IndexModel([('updated_at', ASCENDING)], name='updated'),
+        ],
+        'bookings': [
+            # Overlap check in create_booking and the active-bookings guard in delete_vehicle
+            IndexModel([('vehicle_id', ASCENDING), ('status', ASCENDING), ('start_time', ASCENDING), ('end_time', ASCENDING)],
+                       name='vehicle_status_interval'),
+            IndexModel([('renter_id', ASCENDING), ('created_at', DESCENDING)], name='renter_created'),
+            IndexModel([('owner_id', ASCENDING), ('created_at', DESCENDING)], name='owner_created'),
+            IndexModel([('renter_id', ASCENDING), ('updated_at', ASCENDING)], name='renter_updated'),
+            IndexModel([('owner_id', ASCENDING), ('updated_at', ASCENDING)], name='owner_updated'),
+            # Booking sweep: stale pending requests, finished rentals and bookings due for the archive
+            IndexModel([('status', ASCENDING), ('start_time', ASCENDING)], name='status_start'),
+            IndexModel([('status', ASCENDING), ('created_at', ASCENDING)], name='status_created'),
+            IndexModel([('status', ASCENDING), ('end_time', ASCENDING)], name='status_end'),
+        ],
+        'bookings_archive': [
+            IndexModel([('owner_id', ASCENDING), ('created_at', DESCENDING)], name='owner_created'),
+            IndexModel([('renter_id', ASCENDING), ('created_at', DESCENDING)], name='renter_created'),
+        ],
+        'telemetry': [
+            # Track queries: one vehicle over a time window
+            IndexModel([('vehicle_id', ASCENDING), ('ts', ASCENDING)], name='vehicle_ts'),
+        ],
+        'events': [
+            IndexModel([('seq', ASCENDING)], name='seq'), # Replay on reconnect
+            IndexModel([('created_at', ASCENDING)], name='created'), # Lookback for events inserted out of seq order
+        ],
+        'tombstones': [
+            IndexModel([('collection', ASCENDING), ('deleted_at', ASCENDING)], name='collection_deleted'),
+            # Tombstones only need to outlive the oldest `since` we still accept
+            IndexModel([('deleted_at', ASCENDING)], name='deleted_ttl',
+                       expireAfterSeconds=current_app.config['TOMBSTONE_TTL_DAYS'] * 86400),
+        ],
+    }
+
+# Representative shapes of the queries our routes issue, used to check the plans with explain().
+_sample_id = ObjectId()
+_sample_time = datetime.datetime(2000, 1, 1)
+QUERY_SHAPES = [
+    ('register/login', 'users', {'username': ''}, None),
+    ('GET /vehicles (owner)', 'vehicles', {'owner_id': _sample_id}, PAGE_SORT),
+    ('GET /vehicles (renter)', 'vehicles', {'availability': True}, PAGE_SORT),
+    ('GET /vehicles/search by type and price', 'vehicles', {
+        'availability': True, 'type': {'$in': ['']}, 'rent_price': {'$gte': 0, '$lte': 0}
+    }, SEARCH_SORTS['price_asc']),
+    ('GET /bookings (renter)', 'bookings', {'renter_id': _sample_id}, PAGE_SORT),
+    ('GET /bookings (owner)', 'bookings', {'owner_id': _sample_id}, PAGE_SORT),
+    ('POST /bookings overlap check', 'bookings', {
+        'vehicle_id': _sample_id,
+        'status': {'$in': BLOCKING_STATUSES},
+        'start_time': {'$lt': _sample_time}, 'end_time': {'$gt': _sample_time}
+    }, None),
+    ('DELETE /vehicles active bookings', 'bookings', {
+        'vehicle_id': _sample_id, 'status': {'$in': BLOCKING_STATUSES}
+    }, None),
+    ('booking sweep: finished rentals', 'bookings', {'status': 'confirmed', 'end_time': {'$lte': _sample_time}}, None),
+    ('booking sweep: archive', 'bookings', {
+        'status': {'$in': ['completed', 'cancelled']}, 'end_time': {'$lt': _sample_time}
+    }, None),
+    ('GET /vehicles/<id>/track', 'telemetry', {
+        'vehicle_id': _sample_id, 'ts': {'$gte': _sample_time, '$lt': _sample_time}
+    }, None),
+]
+
+def collection_registry():
+    """Collections that must be created with options: collection name -> create_collection kwargs."""
+    return {
+        # Time-series (MongoDB 5.0+) keyed on vehicle_id; raw positions expire after TELEMETRY_TTL_DAYS
+        'telemetry': {
+            'timeseries': {'timeField': 'ts', 'metaField': 'vehicle_id', 'granularity': 'seconds'},
+            'expireAfterSeconds': current_app.config['TELEMETRY_TTL_DAYS'] * 86400,
+        },
+        # Capped so the event hub can tail it and old events age out by themselves
+        'events': {'capped': True, 'size': current_app.config['EVENTS_LOG_BYTES']},
+    }
+
+def ensure_collections():
+    """Create any collection in collection_registry() that does not exist yet. Returns the names created."""
+    db = mongo.db
+    created = []
+    for collection_name, options in collection_registry().items():
+        if db.list_collection_names(filter={'name': collection_name}):
+            continue
+        try:
+            db.create_collection(collection_name, **options)
+            created.append(collection_name)
+        except CollectionInvalid: # Another worker created it first
+            pass
+        except OperationFailure as e:
+            # e.g. time-series on servers before 5.0: the collection is created plainly on first insert
+            logger.warning('Could not create %s: %s', collection_name, e)
+    return created
+
+def ensure_indexes():
+    """
+    Create the collections in collection_registry() and every index in index_registry().
+    Both steps are no-ops for what already exists, so this is safe to run on every startup.
+    Returns {collection: [index names]} for whatever was ensured.
+    """
+    ensure_collections()
+    ensured = {}
+    for collection_name, indexes in index_registry().items():
+        try:
+            ensured[collection_name] = mongo.db[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            # e.g. duplicate usernames already stored prevent the unique index
+            logger.warning('Could not ensure indexes on %s: %s', collection_name, e)
+    return ensured
+
+def _plan_stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            yield plan['stage']
+        for value in plan.values():
+            yield from _plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _plan_stages(item)
+
+def find_collection_scans():
+    """Return the names of QUERY_SHAPES whose winning plan is still a COLLSCAN."""
+    scans = []
+    for name, collection_name, query, sort in QUERY_SHAPES:
+        cursor = mongo.db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        winning_plan = cursor.explain().get('queryPlanner', {}).get('winningPlan', {})
+        if 'COLLSCAN' in _plan_stages(winning_plan):
+            scans.append(name)
+    return scans
+
+@bp.cli.command('ensure-indexes')
+def ensure_indexes_command():
+    """Create missing indexes and report queries that still scan collections."""
+    for collection_name, names in ensure_indexes().items():
+        click.echo(f"{collection_name}: {', '.join(names)}")
+    scans = find_collection_scans()
+    for name in scans:
+        click.echo(f"COLLSCAN: {name}")
+    if not scans:
+        click.echo('No collection scans in the known query shapes.')
+
+@bp.cli.command('backfill-bookings')
+@click.option('--batch-size', default=500, help='Updates sent per bulk_write.')
+def backfill_bookings_command(batch_size):
+    """Store owner_id and the vehicle/renter summaries on bookings created before they existed."""
+    def flush(requests):
+        if requests:
+            bookings_collection.bulk_write(requests, ordered=False)
+        return []
+
+    updated_vehicles = updated_renters = 0
+    requests = []
+    vehicle_ids = bookings_collection.distinct('vehicle_id', {'$or': [
+        {'owner_id': {'$exists': False}}, {'vehicle_details': {'$exists': False}}
+    ]})
+    for vehicle in vehicles_collection.find({'_id': {'$in': vehicle_ids}}):
+        requests.append(UpdateMany({'vehicle_id': vehicle['_id']}, {'$set': {
+            'owner_id': vehicle['owner_id'],
+            'vehicle_details': vehicle_summary(vehicle),
+            'updated_at': datetime.datetime.utcnow()
+        }}))
+        updated_vehicles += 1
+        if len(requests) >= batch_size:
+            requests = flush(requests)
+
+    renter_ids = bookings_collection.distinct('renter_id', {'renter_details': {'$exists': False}})
+    for renter in users_collection.find({'_id': {'$in': renter_ids}}, {'password': 0}):
+        requests.append(UpdateMany({'renter_id': renter['_id']}, {'$set': {
+            'renter_details': renter_summary(renter),
+            'updated_at': datetime.datetime.utcnow()
+        }}))
+        updated_renters += 1
+        if len(requests) >= batch_size:
+            requests = flush(requests)
+    flush(requests)
+    click.echo(f"Backfilled bookings for {updated_vehicles} vehicles and {updated_renters} renters.")
+
+@bp.cli.command('rebuild-owner-stats')
+def rebuild_owner_stats_command():
+    """Recompute the dashboard counters of every owner."""
+    owner_ids = users_collection.distinct('_id', {'role': 'owner'})
+    for owner_id in owner_ids:
+        rebuild_owner_stats(owner_id)
+    click.echo(f"Rebuilt stats for {len(owner_ids)} owners.")
+
+@bp.cli.command('normalize-locations')
+def normalize_locations_command():
+    """Backfill the GeoJSON `geo` field for vehicles created before it existed."""
+    updated = []
+    for vehicle in vehicles_collection.find({'geo': {'$exists': False}}, {'location': 1}):
+        geo = location_to_geojson(vehicle.get('location'))
+        if geo:
+            vehicles_collection.update_one({'_id': vehicle['_id']}, {'$set': {'geo': geo, 'updated_at': datetime.datetime.utcnow()}})
+            updated.append(vehicle['_id'])
+    if updated:
+        invalidate_vehicle_caches(*updated)
+    click.echo(f"Normalized {len(updated)} vehicle locations.")
+
+@bp.cli.command('booking-sweep')
+@click.option('--loop', is_flag=True, help='Keep sweeping every SCHEDULER_INTERVAL seconds.')
+def booking_sweep_command(loop):
+    """Expire stale requests, complete finished bookings, fix availability and archive old bookings."""
+    if loop:
+        booking_scheduler.run_forever(current_app._get_current_object())
+    report = booking_scheduler.run_once()
+    click.echo(', '.join(f'{k}: {v}' for k, v in report.items()))
+
+# --- App Factory ---
+
+def create_app(config=None):
+    """
+    Build the Flask app. Settings come from DEFAULT_CONFIG, then the environment,
+    then `config`. No connection is opened here: each worker process creates its
+    own MongoClient on first use. The connection, caches, event hub, scheduler and
+    process pools belong to the app, so apps built with different settings stay apart.
+    """
+    app = Flask(__name__)
+    app.config.from_mapping(DEFAULT_CONFIG)
+    app.config.from_mapping(config_from_env())
+    if config:
+        app.config.from_mapping(config)
+    CORS(app, expose_headers=['X-Next-Cursor', 'ETag'])
+    app.register_blueprint(bp)
+
+    if app.config['SECRET_KEY'] in ('', 'your-very-secret-key'): # Unset, or the placeholder older versions shipped
+        if not (app.debug or app.testing):
+            raise RuntimeError('SECRET_KEY is not set; it signs every access token, so set it in the environment.')
+        app.config['SECRET_KEY'] = secrets.token_hex(32) # Tokens from a debug or test app die with the process
+
+    config = app.config
+    app.extensions['agri_rental'] = {
+        'mongo': MongoConnection(config),
+        'user_cache': TTLCache(config['USER_CACHE_MAXSIZE'], config['USER_CACHE_TTL']),
+        'facet_cache': TTLCache(config['FACET_CACHE_MAXSIZE'], config['FACET_CACHE_TTL']),
+        'vehicle_cache': ReadThroughCache(config),
+        'event_hub': EventHub(config),
+        'booking_scheduler': BookingScheduler(),
+        'hash_workers': WorkerPool(config['PASSWORD_HASH_WORKERS'], config['PASSWORD_HASH_QUEUE']),
+        'image_workers': WorkerPool(config['IMAGE_WORKERS']),
+    }
+    return app
 
 if __name__ == '__main__':
+    app = create_app({'DEBUG': True})
+    if app.config['ENSURE_INDEXES_ON_STARTUP']:
+        with app.app_context():
+            ensure_indexes()
     app.run(debug=True, host='0.0.0.0', port=5000, use_reloader=False)
\ No newline at end of file
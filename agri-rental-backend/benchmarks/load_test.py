@@ -0,0 +1,267 @@
+"""
+API load test.
+
+Drives the real routes with a renter/owner traffic mix against a server whose
+database was filled by benchmarks/seed.py, then reports throughput and
+p50/p95/p99 latency per endpoint. Results are saved as JSON; pass an earlier
+result with --compare to see how each endpoint moved between commits.
+
+    python benchmarks/seed.py --db agri_rental_bench --drop
+    SECRET_KEY=bench MONGO_DB=agri_rental_bench gunicorn -c gunicorn.conf.py wsgi:app
+    python benchmarks/load_test.py --base-url http://localhost:5000 --duration 60 --output after.json --compare before.json
+
+Each virtual user logs in once, then loops over weighted actions. Renters browse
+the available list and vehicle details, check their bookings, request bookings
+and cancel pending ones; owners work through their booking list, confirm or
+cancel pending requests and look at their fleet. 4xx answers that the mix
+provokes on purpose (409 on a clashing booking, a request someone else already
+answered) are counted per status but not as errors; 5xx and connection
+failures are.
+"""
+import argparse
+import datetime
+import json
+import random
+import subprocess
+import threading
+import time
+import urllib.error
+
+from login_saturation import call, percentile
+
+RENTER_MIX = [
+    ('browse_vehicles', 40),
+    ('vehicle_detail', 25),
+    ('my_bookings', 15),
+    ('book', 10),
+    ('cancel', 5),
+    ('login', 5),
+]
+OWNER_MIX = [
+    ('my_bookings', 40),
+    ('browse_vehicles', 20),
+    ('vehicle_detail', 10),
+    ('decide', 25),
+    ('login', 5),
+]
+
+
+class Recorder:
+    """Latency samples and status counts per endpoint."""
+    def __init__(self):
+        self.samples = {}
+        self.statuses = {}
+        self.lock = threading.Lock()
+
+    def add(self, endpoint, status, seconds):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append(seconds)
+            counts = self.statuses.setdefault(endpoint, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+    def report(self, duration):
+        endpoints = {}
+        for endpoint in sorted(self.samples):
+            samples, statuses = self.samples[endpoint], self.statuses[endpoint]
+            errors = sum(n for status, n in statuses.items() if status == '0' or int(status) >= 500)
+            endpoints[endpoint] = summarize(samples, duration, errors, statuses)
+        every = [s for samples in self.samples.values() for s in samples]
+        errors = sum(e['errors'] for e in endpoints.values())
+        return {'total': summarize(every, duration, errors), 'endpoints': endpoints}
+
+
+def summarize(samples, duration, errors, statuses=None):
+    summary = {
+        'requests': len(samples),
+        'requests_per_second': round(len(samples) / duration, 2),
+        'errors': errors,
+        'p50_ms': percentile(samples, 50),
+        'p95_ms': percentile(samples, 95),
+        'p99_ms': percentile(samples, 99),
+        'max_ms': round(max(samples) * 1000, 2) if samples else None,
+    }
+    if statuses is not None:
+        summary['statuses'] = statuses
+    return summary
+
+
+class VirtualUser:
+    def __init__(self, base_url, username, password, role, rng, recorder, vehicle_ids):
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.role = role
+        self.rng = rng
+        self.recorder = recorder
+        # Renters share one pool of IDs seen in list responses; owners only ever see their own fleet
+        self.vehicle_ids = vehicle_ids if role == 'renter' else {'ids': [], 'lock': threading.Lock()}
+        self.pending = [] # IDs of this user's pending bookings seen in list responses
+        self.token = None
+
+    def request(self, endpoint, method, path, body=None):
+        started = time.perf_counter()
+        try:
+            status, payload = call(self.base_url, method, path, body, token=self.token)
+        except (urllib.error.URLError, OSError):
+            status, payload = 0, None
+        self.recorder.add(endpoint, status, time.perf_counter() - started)
+        return status, payload
+
+    def login(self):
+        status, body = self.request('POST /login', 'POST', '/login', {'username': self.username, 'password': self.password})
+        if status == 200:
+            self.token = body['token']
+        return status
+
+    def browse_vehicles(self):
+        status, body = self.request('GET /vehicles', 'GET', '/vehicles?limit=20')
+        if status == 200 and body:
+            ids = [v['_id'] for v in body if v.get('availability', True)]
+            with self.vehicle_ids['lock']:
+                pool = self.vehicle_ids['ids']
+                pool.extend(ids)
+                del pool[:-1000]
+
+    def vehicle_detail(self):
+        with self.vehicle_ids['lock']:
+            pool = self.vehicle_ids['ids']
+            vehicle_id = self.rng.choice(pool) if pool else None
+        if vehicle_id is None:
+            return self.browse_vehicles()
+        self.request('GET /vehicles/<id>', 'GET', f'/vehicles/{vehicle_id}')
+
+    def my_bookings(self):
+        status, body = self.request('GET /bookings', 'GET', '/bookings?limit=20')
+        if status == 200 and body:
+            self.pending = [b['_id'] for b in body if b.get('status') == 'pending']
+
+    def book(self):
+        with self.vehicle_ids['lock']:
+            pool = self.vehicle_ids['ids']
+            vehicle_id = self.rng.choice(pool) if pool else None
+        if vehicle_id is None:
+            return self.browse_vehicles()
+        start = datetime.datetime.utcnow() + datetime.timedelta(days=self.rng.randint(30, 330))
+        end = start + datetime.timedelta(days=self.rng.randint(1, 3))
+        self.request('POST /bookings', 'POST', '/bookings', {
+            'vehicle_id': vehicle_id,
+            'start_time': start.replace(microsecond=0).isoformat(),
+            'end_time': end.replace(microsecond=0).isoformat(),
+        })
+
+    def cancel(self):
+        self.change_status('cancelled')
+
+    def decide(self):
+        self.change_status('confirmed' if self.rng.random() < 0.6 else 'cancelled')
+
+    def change_status(self, new_status):
+        if not self.pending:
+            return self.my_bookings()
+        booking_id = self.pending.pop()
+        self.request('PUT /bookings/<id>', 'PUT', f'/bookings/{booking_id}', {'status': new_status})
+
+    def run(self, stop):
+        mix = RENTER_MIX if self.role == 'renter' else OWNER_MIX
+        actions = [name for name, _ in mix]
+        weights = [weight for _, weight in mix]
+        while not stop.is_set():
+            if self.token is None:
+                if self.login() != 200:
+                    time.sleep(0.5)
+                continue
+            getattr(self, self.rng.choices(actions, weights)[0])()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print how each endpoint's throughput and p95/p99 moved against an earlier run."""
+    print(f"\nCompared with {baseline.get('label') or baseline.get('revision') or 'baseline'}:")
+    print(f"{'endpoint':<22}{'req/s':>24}{'p95 ms':>28}{'p99 ms':>28}")
+    rows = [('total', results['total'], baseline['total'])]
+    rows += [(name, stats, baseline['endpoints'].get(name)) for name, stats in results['endpoints'].items()]
+    for name, now, before in rows:
+        if not before:
+            continue
+        cells = []
+        for key in ['requests_per_second', 'p95_ms', 'p99_ms']:
+            old, new = before.get(key), now.get(key)
+            change = f' ({(new - old) / old * 100:+.0f}%)' if old and new is not None else ''
+            cells.append(f'{old} -> {new}{change}')
+        print(f'{name:<22}{cells[0]:>24}{cells[1]:>28}{cells[2]:>28}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds of measured traffic')
+    parser.add_argument('--warmup', type=float, default=5, help='Seconds of unmeasured traffic first')
+    parser.add_argument('--users', type=int, default=32, help='Concurrent virtual users (one thread each)')
+    parser.add_argument('--owner-share', type=float, default=0.2, help='Fraction of virtual users that are owners')
+    parser.add_argument('--owners', type=int, default=200, help='Owners seeded by seed.py')
+    parser.add_argument('--renters', type=int, default=2000, help='Renters seeded by seed.py')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--random-seed', type=int, default=42)
+    parser.add_argument('--label', help='Name for this run in the results, e.g. the change being measured')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Earlier results JSON to compare against')
+    args = parser.parse_args()
+
+    rng = random.Random(args.random_seed)
+    owner_count = round(args.users * args.owner_share)
+    owner_names = rng.sample(range(args.owners), min(owner_count, args.owners))
+    renter_names = rng.sample(range(args.renters), min(args.users - len(owner_names), args.renters))
+    vehicle_ids = {'ids': [], 'lock': threading.Lock()}
+
+    def make_users(recorder):
+        users = [('owner', f'bench_owner_{n}') for n in owner_names]
+        users += [('renter', f'bench_renter_{n}') for n in renter_names]
+        return [VirtualUser(args.base_url, username, args.password, role,
+                            random.Random(f'{args.random_seed}-{username}'), recorder, vehicle_ids)
+                for role, username in users]
+
+    def run_phase(users, seconds):
+        stop = threading.Event()
+        threads = [threading.Thread(target=user.run, args=(stop,)) for user in users]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    users = make_users(Recorder())
+    if args.warmup:
+        run_phase(users, args.warmup)
+    recorder = Recorder()
+    for user in users:
+        user.recorder = recorder # Keep warm tokens and ID pools, drop warmup samples
+    run_phase(users, args.duration)
+
+    results = {
+        'label': args.label,
+        'revision': git_revision(),
+        'finished_at': datetime.datetime.utcnow().isoformat(timespec='seconds'),
+        'base_url': args.base_url,
+        'duration': args.duration,
+        'users': {'owners': len(owner_names), 'renters': len(renter_names)},
+        'random_seed': args.random_seed,
+        **recorder.report(args.duration),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Login saturation benchmark.
+
+Measures login throughput and the latency of a non-auth endpoint (GET /vehicles)
+first on its own, then while a pool of threads keeps /login saturated. With
+password hashing offloaded to the process pool, the probe's p99 should barely move.
+
+Run against a live server:
+    python benchmarks/login_saturation.py --base-url http://localhost:5000 --duration 20
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def call(base_url, method, path, body=None, token=None):
+    """Send one request and return (status, parsed JSON body or None)."""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method)
+    req.add_header('Content-Type', 'application/json')
+    if token:
+        req.add_header('x-access-token', token)
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            payload = resp.read()
+            return resp.status, json.loads(payload) if payload else None
+    except urllib.error.HTTPError as e:
+        payload = e.read()
+        try:
+            return e.code, json.loads(payload) if payload else None
+        except ValueError:
+            return e.code, None
+
+
+def ensure_user(base_url, username, password):
+    """Log in, registering a renter first if the user does not exist yet. Returns a token."""
+    status, body = call(base_url, 'POST', '/login', {'username': username, 'password': password})
+    if status == 200:
+        return body['token']
+    call(base_url, 'POST', '/register', {
+        'username': username, 'password': password,
+        'fullname': 'Bench User', 'phone': '0000000000', 'address': 'bench'
+    })
+    status, body = call(base_url, 'POST', '/login', {'username': username, 'password': password})
+    if status == 403 and body.get('temp_token'):
+        status, body = call(base_url, 'PUT', f'/users/{username}/role', {'role': 'renter'}, token=body['temp_token'])
+    if status != 200:
+        raise SystemExit(f'Could not log in as {username}: {status} {body}')
+    return body['token']
+
+
+def percentile(samples, pct):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index] * 1000, 2)
+
+
+def run_phase(base_url, token, username, password, duration, login_threads, probe_threads):
+    stop = threading.Event()
+    probe_latencies, login_latencies = [], []
+    login_errors = [0]
+    lock = threading.Lock()
+
+    def probe():
+        while not stop.is_set():
+            started = time.perf_counter()
+            call(base_url, 'GET', '/vehicles?limit=20', token=token)
+            with lock:
+                probe_latencies.append(time.perf_counter() - started)
+
+    def login():
+        while not stop.is_set():
+            started = time.perf_counter()
+            status, _ = call(base_url, 'POST', '/login', {'username': username, 'password': password})
+            with lock:
+                if status == 200:
+                    login_latencies.append(time.perf_counter() - started)
+                else:
+                    login_errors[0] += 1
+
+    threads = [threading.Thread(target=probe) for _ in range(probe_threads)]
+    threads += [threading.Thread(target=login) for _ in range(login_threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        'login_threads': login_threads,
+        'logins_per_second': round(len(login_latencies) / duration, 2),
+        'login_errors': login_errors[0],
+        'login_p50_ms': percentile(login_latencies, 50),
+        'login_p99_ms': percentile(login_latencies, 99),
+        'probe_requests': len(probe_latencies),
+        'probe_p50_ms': percentile(probe_latencies, 50),
+        'probe_p95_ms': percentile(probe_latencies, 95),
+        'probe_p99_ms': percentile(probe_latencies, 99),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--username', default='bench_login_user')
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per phase')
+    parser.add_argument('--login-threads', type=int, default=16)
+    parser.add_argument('--probe-threads', type=int, default=4)
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    args = parser.parse_args()
+
+    token = ensure_user(args.base_url, args.username, args.password)
+    results = {
+        'baseline': run_phase(args.base_url, token, args.username, args.password, args.duration, 0, args.probe_threads),
+        'saturated': run_phase(args.base_url, token, args.username, args.password, args.duration,
+                               args.login_threads, args.probe_threads),
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""
+Seed a Mongo database for the load test.
+
+Creates owners, renters, vehicles and bookings shaped exactly like the API writes
+them (denormalized summaries, amounts, GeoJSON, timestamps). The same --random-seed
+always produces the same data, so runs on different commits start from identical
+state. The script does not import the app, so it seeds the same way whichever
+commit is checked out. Indexes and owner dashboard counters are left to the server
+under test: gunicorn ensures indexes on start, and the counters are computed on
+the first GET /owner/summary.
+
+Users are named bench_owner_<n> / bench_renter_<n> and share one password.
+
+    python benchmarks/seed.py --db agri_rental_bench --drop --vehicles 5000 --bookings 20000
+"""
+import argparse
+import datetime
+import math
+import os
+import random
+import time
+
+from bson import ObjectId
+from pymongo import MongoClient
+from werkzeug.security import generate_password_hash
+
+VEHICLE_TYPES = ['tractor', 'harvester', 'tiller', 'sprayer', 'seeder', 'trailer']
+# Rough bounding box of the service area, so /vehicles/nearby finds neighbours
+LAT_RANGE = (15.0, 19.5)
+LNG_RANGE = (76.0, 81.0)
+# Copies of the summaries the API stores on bookings
+BOOKING_VEHICLE_FIELDS = ['vehicle_name', 'model', 'type', 'rent_price', 'image1_url']
+BOOKING_RENTER_FIELDS = ['username', 'fullname', 'phone', 'address']
+
+
+def vehicle_summary(vehicle):
+    return {**{k: vehicle.get(k) for k in BOOKING_VEHICLE_FIELDS}, '_id': vehicle['_id']}
+
+
+def renter_summary(user):
+    return {**{k: user.get(k) for k in BOOKING_RENTER_FIELDS}, '_id': user['_id']}
+
+
+def booking_amount(rent_price, start_time, end_time):
+    """The daily rent for every started day, as POST /bookings computes it."""
+    days = max(1, math.ceil((end_time - start_time).total_seconds() / 86400))
+    return round(rent_price * days, 2)
+
+
+def batched_insert(collection, docs, batch_size):
+    for i in range(0, len(docs), batch_size):
+        collection.insert_many(docs[i:i + batch_size], ordered=False)
+
+
+def make_users(rng, prefix, role, count, password_hash, now):
+    return [{
+        '_id': ObjectId(),
+        'username': f'{prefix}{i}',
+        'fullname': f'Bench {role.title()} {i}',
+        'phone': f'9{rng.randrange(10**8, 10**9)}',
+        'address': f'Village {rng.randrange(1000)}',
+        'password': password_hash,
+        'role': role,
+        'created_at': now - datetime.timedelta(days=rng.uniform(30, 365)),
+    } for i in range(count)]
+
+
+def make_vehicles(rng, owners, count, now):
+    vehicles = []
+    for i in range(count):
+        owner = rng.choice(owners)
+        location = {'latitude': round(rng.uniform(*LAT_RANGE), 5), 'longitude': round(rng.uniform(*LNG_RANGE), 5)}
+        vehicle_type = rng.choice(VEHICLE_TYPES)
+        created_at = now - datetime.timedelta(days=rng.uniform(0, 365))
+        vehicles.append({
+            '_id': ObjectId(),
+            'owner_id': owner['_id'],
+            'vehicle_name': f'{vehicle_type.title()} {i}',
+            'model': f'Model {rng.randrange(1, 40)}',
+            'type': vehicle_type,
+            'rent_price': float(rng.randrange(500, 5000, 50)),
+            'availability': True,
+            'image1_url': '',
+            'image2_url': '',
+            'location': location,
+            'geo': {'type': 'Point', 'coordinates': [location['longitude'], location['latitude']]},
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+    return vehicles
+
+
+def make_bookings(rng, vehicles, renters, count, now):
+    """
+    Bookings are laid out one after another on each vehicle from 180 days ago to
+    roughly 60 days ahead, so none overlap. Finished ones are completed or
+    cancelled; the rest are split between pending, confirmed and cancelled like
+    live traffic. As in the API, a vehicle holds at most one confirmed booking at a
+    time: it is unlisted until that booking ends, so further requests stay pending.
+    """
+    # Average gap between bookings on one vehicle that spreads them over the 240 days
+    spacing = 240 * len(vehicles) / max(count, 1)
+    next_start = {}
+    bookings = []
+    for _ in range(count):
+        vehicle = rng.choice(vehicles)
+        start_time = next_start.get(vehicle['_id'], now - datetime.timedelta(days=180))
+        start_time += datetime.timedelta(days=rng.uniform(0, max(0, 2 * spacing - 2)))
+        end_time = start_time + datetime.timedelta(days=rng.randint(1, 3))
+        next_start[vehicle['_id']] = end_time
+        if end_time < now:
+            status = 'completed' if rng.random() < 0.8 else 'cancelled'
+        else:
+            status = rng.choices(['pending', 'confirmed', 'cancelled'], [0.6, 0.2, 0.2])[0]
+        if status == 'confirmed' and not vehicle['availability']:
+            status = 'pending' # Already claimed by an earlier confirmed booking
+        if status == 'confirmed':
+            vehicle['availability'] = False # A confirmed booking claims the vehicle
+        renter = rng.choice(renters)
+        created_at = min(now, start_time - datetime.timedelta(days=rng.uniform(1, 14)))
+        bookings.append({
+            'renter_id': renter['_id'],
+            'vehicle_id': vehicle['_id'],
+            'owner_id': vehicle['owner_id'],
+            'vehicle_details': vehicle_summary(vehicle),
+            'renter_details': renter_summary(renter),
+            'start_time': start_time,
+            'end_time': end_time,
+            'status': status,
+            'amount': booking_amount(vehicle['rent_price'], start_time, end_time),
+            'created_at': created_at,
+            'updated_at': created_at,
+        })
+    return bookings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongo-uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/'))
+    parser.add_argument('--db', default='agri_rental_bench', help='Database to seed; point the server at the same one')
+    parser.add_argument('--drop', action='store_true', help='Drop the database first')
+    parser.add_argument('--owners', type=int, default=200)
+    parser.add_argument('--renters', type=int, default=2000)
+    parser.add_argument('--vehicles', type=int, default=5000)
+    parser.add_argument('--bookings', type=int, default=20000)
+    parser.add_argument('--password', default='bench-password')
+    parser.add_argument('--hash-method', default='pbkdf2:sha256:600000', help="The server's PASSWORD_HASH_METHOD")
+    parser.add_argument('--random-seed', type=int, default=42)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    client = MongoClient(args.mongo_uri)
+    db = client[args.db]
+    rng = random.Random(args.random_seed)
+    now = datetime.datetime.utcnow()
+    started = time.perf_counter()
+
+    if args.drop:
+        client.drop_database(args.db)
+    # Every user shares one hash: computing one per user would dominate seeding time
+    password_hash = generate_password_hash(args.password, args.hash_method)
+    owners = make_users(rng, 'bench_owner_', 'owner', args.owners, password_hash, now)
+    renters = make_users(rng, 'bench_renter_', 'renter', args.renters, password_hash, now)
+    vehicles = make_vehicles(rng, owners, args.vehicles, now)
+    bookings = make_bookings(rng, vehicles, renters, args.bookings, now)
+
+    batched_insert(db.users, owners + renters, args.batch_size)
+    batched_insert(db.vehicles, vehicles, args.batch_size)
+    batched_insert(db.bookings, bookings, args.batch_size)
+    db.owner_stats.drop() # Stale once bookings are added; the server rebuilds each owner's on first read
+
+    print(f"Seeded {args.db}: {len(owners)} owners, {len(renters)} renters, {len(vehicles)} vehicles, "
+          f"{len(bookings)} bookings in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
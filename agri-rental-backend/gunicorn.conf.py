@@ -0,0 +1,56 @@
+"""
+Gunicorn settings for the API.
+
+Each worker process opens its own MongoClient on first use, so the number of
+Mongo connections is at most workers x MONGO_MAX_POOL_SIZE; with gthread a
+worker never needs more than `threads` of them at once. Watch GET /pool/stats
+(wait_avg_ms / checkout_failures) when changing these numbers.
+
+Every open GET /events stream holds a gthread thread, so these workers take at
+most EVENTS_MAX_STREAMS of them each and answer the rest with 503. The streams
+belong on the gevent pool in gunicorn.events.conf.py; deploy/nginx.conf routes
+/events there and everything else here.
+
+GET /metrics adds up every worker of the pool: each one writes its samples to
+PROMETHEUS_MULTIPROC_DIR, which is emptied on start.
+
+The booking lifecycle sweep runs outside the web workers as its own process:
+    flask --app wsgi booking-sweep --loop
+or inside them with SCHEDULER_ENABLED=1, where a Mongo lease lets one worker sweep at a time.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Must be set before the app imports prometheus_client, so here rather than in on_starting
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'agri-rental-metrics'))
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000)) # gevent only
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+# Recycle workers now and then to bound memory growth
+max_requests = 5000
+max_requests_jitter = 500
+
+
+def child_exit(server, worker):
+    """An exited worker no longer counts towards live gauges (open connections, streams)."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_starting(server):
+    """Drop the metric samples of a previous run, then ensure indexes once in the master instead of in every worker."""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True) # They would otherwise be added to this run's
+    os.makedirs(metrics_dir)
+    from app import create_app, ensure_indexes
+    app = create_app()
+    if app.config['ENSURE_INDEXES_ON_STARTUP']:
+        with app.app_context():
+            ensure_indexes()
@@ -0,0 +1,43 @@
+"""
+Gunicorn settings for the GET /events pool.
+
+An open event stream lasts as long as the app stays open. On gevent workers each
+one is a greenlet instead of a thread, so a worker holds thousands of idle
+streams while the API pool in gunicorn.conf.py keeps its threads for requests.
+Run both pools and route /events here (deploy/nginx.conf does):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    gunicorn -c gunicorn.events.conf.py wsgi:app
+
+The pool keeps its metrics apart from the API pool's (EVENTS_PROMETHEUS_MULTIPROC_DIR),
+so each pool's GET /metrics reports that pool; scrape both.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+os.environ['PROMETHEUS_MULTIPROC_DIR'] = os.environ.get(
+    'EVENTS_PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'agri-rental-events-metrics'))
+
+bind = os.environ.get('EVENTS_BIND', '0.0.0.0:5001')
+workers = int(os.environ.get('EVENTS_WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gevent' # Patches sockets and threads before the app is loaded
+worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 2000))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+# Streams per worker, a little under worker_connections so the overflow gets a 503 rather than a stalled accept
+raw_env = [f"EVENTS_MAX_STREAMS={os.environ.get('EVENTS_MAX_STREAMS', max(1, worker_connections - 50))}"]
+
+
+def on_starting(server):
+    """Drop the metric samples of a previous run."""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    """An exited worker no longer counts towards the open streams gauge."""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,74 @@
+import datetime
+import os
+import sys
+import threading
+
+import jwt
+import mongomock
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import app as api
+
+SECRET_KEY = 'test-secret-key'
+
+# mongomock applies each of these as separate read and write steps, while a real
+# server applies a single write atomically. Tests that race requests need the latter.
+ATOMIC_METHODS = ['find_one_and_update', 'update_one', 'update_many', 'replace_one',
+                  'insert_one', 'insert_many', 'delete_one', 'delete_many', 'bulk_write']
+
+
+@pytest.fixture(autouse=True)
+def atomic_writes(monkeypatch):
+    lock = threading.RLock()
+    for name in ATOMIC_METHODS:
+        def locked(self, *args, _original=getattr(mongomock.Collection, name), **kwargs):
+            with lock:
+                return _original(self, *args, **kwargs)
+        monkeypatch.setattr(mongomock.Collection, name, locked)
+
+
+@pytest.fixture
+def app():
+    flask_app = api.create_app({'TESTING': True, 'SECRET_KEY': SECRET_KEY})
+    mongo = flask_app.extensions['agri_rental']['mongo']
+    mongo._client = mongomock.MongoClient()
+    mongo._pid = os.getpid()
+    mongo.transactions_supported = False # mongomock has no sessions
+    with flask_app.app_context():
+        yield flask_app
+
+
+@pytest.fixture
+def db(app):
+    return api.mongo.db
+
+
+def auth_headers(user):
+    token = jwt.encode({'user_id': str(user['_id']), 'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)},
+                       SECRET_KEY, algorithm='HS256')
+    return {'x-access-token': token}
+
+
+@pytest.fixture
+def make_user(db):
+    def make(role, username=None):
+        user = {'username': username or f'{role}-{db.users.count_documents({})}', 'fullname': role.title(),
+                'phone': '9000000000', 'address': 'Village', 'password': 'unused', 'role': role,
+                'created_at': datetime.datetime.utcnow()}
+        db.users.insert_one(user)
+        return user, auth_headers(user)
+    return make
+
+
+@pytest.fixture
+def make_vehicle(db):
+    def make(owner, **fields):
+        now = datetime.datetime.utcnow()
+        vehicle = {'owner_id': owner['_id'], 'vehicle_name': 'Tractor', 'model': 'M1', 'type': 'tractor',
+                   'rent_price': 1000.0, 'availability': True, 'image1_url': '', 'image2_url': '',
+                   'location': {'latitude': 17.0, 'longitude': 78.0}, 'created_at': now, 'updated_at': now, **fields}
+        db.vehicles.insert_one(vehicle)
+        return vehicle
+    return make
@@ -0,0 +1,23 @@
+import pytest
+
+import app as api
+
+
+def test_refuses_to_start_without_secret_key(monkeypatch):
+    monkeypatch.delenv('SECRET_KEY', raising=False)
+    with pytest.raises(RuntimeError):
+        api.create_app()
+    with pytest.raises(RuntimeError):
+        api.create_app({'SECRET_KEY': 'your-very-secret-key'})
+    assert api.create_app({'DEBUG': True}).config['SECRET_KEY']
+
+
+def test_apps_keep_their_own_connection_and_caches(app):
+    other = api.create_app({'TESTING': True, 'SECRET_KEY': 'other', 'MONGO_DB': 'other_db', 'USER_CACHE_TTL': 5})
+    with other.app_context():
+        assert api.mongo.config['MONGO_DB'] == 'other_db'
+        assert api.user_cache.ttl == 5
+        api.user_cache.set('someone', {'username': 'x'})
+    assert api.mongo.config['MONGO_DB'] == app.config['MONGO_DB']
+    assert api.user_cache.ttl == app.config['USER_CACHE_TTL']
+    assert api.user_cache.get('someone') is None
@@ -0,0 +1,24 @@
+import datetime
+
+
+def test_offset_times_are_compared_in_utc(app, db, make_user, make_vehicle):
+    owner, _ = make_user('owner')
+    renter, headers = make_user('renter')
+    vehicle = make_vehicle(owner)
+    day = (datetime.datetime.utcnow() + datetime.timedelta(days=2)).replace(hour=0, minute=0, second=0, microsecond=0)
+    db.bookings.insert_one({'renter_id': renter['_id'], 'owner_id': owner['_id'], 'vehicle_id': vehicle['_id'],
+                            'status': 'confirmed', 'start_time': day + datetime.timedelta(hours=6),
+                            'end_time': day + datetime.timedelta(hours=10), 'created_at': day, 'updated_at': day})
+
+    # 09:30-17:30 at +05:30 is 04:00-12:00 UTC
+    response = app.test_client().post('/vehicles/availability', headers=headers, json={
+        'vehicle_ids': [str(vehicle['_id'])],
+        'start_time': (day + datetime.timedelta(hours=9, minutes=30)).isoformat() + '+05:30',
+        'end_time': (day + datetime.timedelta(hours=17, minutes=30)).isoformat() + '+05:30',
+    })
+    assert response.status_code == 200
+    slots = response.get_json()[str(vehicle['_id'])]
+    assert slots['busy'] == [{'start': (day + datetime.timedelta(hours=6)).isoformat(),
+                              'end': (day + datetime.timedelta(hours=10)).isoformat()}]
+    assert slots['free'][0] == {'start': (day + datetime.timedelta(hours=4)).isoformat(),
+                                'end': (day + datetime.timedelta(hours=6)).isoformat()}
@@ -0,0 +1,65 @@
+import datetime
+
+import app as api
+
+
+def test_archived_bookings_leave_tombstones(app, db, make_user, make_vehicle):
+    owner, owner_headers = make_user('owner')
+    renter, headers = make_user('renter')
+    vehicle = make_vehicle(owner)
+    ended = datetime.datetime.utcnow() - datetime.timedelta(days=200)
+    booking = {'renter_id': renter['_id'], 'owner_id': owner['_id'], 'vehicle_id': vehicle['_id'],
+               'status': 'completed', 'start_time': ended - datetime.timedelta(days=1), 'end_time': ended,
+               'created_at': ended, 'updated_at': ended}
+    db.bookings.insert_one(booking)
+    since = (datetime.datetime.utcnow() - datetime.timedelta(days=1)).isoformat()
+
+    assert api.archive_bookings(datetime.datetime.utcnow() - datetime.timedelta(days=180), 10) == 1
+
+    client = app.test_client()
+    for user_headers in (headers, owner_headers):
+        delta = client.get(f'/bookings?since={since}', headers=user_headers).get_json()
+        assert delta['deleted'] == [str(booking['_id'])]
+
+
+def test_scheduler_survives_unexpected_errors(app, monkeypatch):
+    calls = []
+
+    def failing_lease(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise SystemExit # Stop the loop once it has come back from the first failure
+        raise KeyError('unexpected')
+
+    monkeypatch.setattr(api, 'acquire_lease', failing_lease)
+    monkeypatch.setattr(api.time, 'sleep', lambda seconds: None)
+    try:
+        api.BookingScheduler().run_forever(app)
+    except SystemExit:
+        pass
+    assert len(calls) == 2
+
+
+def test_sweep_only_counts_rows_it_moved(app, db, make_user, make_vehicle, monkeypatch):
+    owner, _ = make_user('owner')
+    renter, _ = make_user('renter')
+    vehicle = make_vehicle(owner)
+    start = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    ids = [db.bookings.insert_one({'renter_id': renter['_id'], 'owner_id': owner['_id'], 'vehicle_id': vehicle['_id'],
+                                   'status': 'pending', 'amount': 100.0, 'start_time': start,
+                                   'end_time': start + datetime.timedelta(days=1), 'created_at': start,
+                                   'updated_at': start}).inserted_id for _ in range(2)]
+
+    class RacingBookings:
+        """A renter cancels the second booking in the same millisecond the sweep writes."""
+        def __getattr__(self, attr):
+            return getattr(db.bookings, attr)
+
+        def bulk_write(self, requests, **kwargs):
+            now = requests[0]._doc['$set']['updated_at']
+            db.bookings.update_one({'_id': ids[1]}, {'$set': {'status': 'cancelled', 'updated_at': now}})
+            return db.bookings.bulk_write(requests, **kwargs)
+
+    monkeypatch.setattr(api, 'bookings_collection', RacingBookings())
+    moved = api.move_bookings({'_id': {'$in': ids}}, 'pending', 'cancelled', 10)
+    assert [b['_id'] for b in moved] == [ids[0]]
@@ -0,0 +1,112 @@
+import datetime
+import threading
+
+import app as api
+
+THREADS = 8
+
+
+def run_in_parallel(app, calls):
+    """Start every call at once, each with its own test client. Returns the responses in order."""
+    barrier = threading.Barrier(len(calls))
+    responses = [None] * len(calls)
+
+    def worker(i, call):
+        client = app.test_client()
+        barrier.wait()
+        responses[i] = call(client)
+
+    threads = [threading.Thread(target=worker, args=(i, call)) for i, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return responses
+
+
+def request_booking(client, headers, vehicle, days_ahead, days=1):
+    start = datetime.datetime.utcnow().replace(microsecond=0) + datetime.timedelta(days=days_ahead)
+    return client.post('/bookings', headers=headers, json={
+        'vehicle_id': str(vehicle['_id']),
+        'start_time': start.isoformat(),
+        'end_time': (start + datetime.timedelta(days=days)).isoformat(),
+    })
+
+
+def test_parallel_confirms_of_one_booking_succeed_once(app, db, make_user, make_vehicle):
+    owner, owner_headers = make_user('owner')
+    _, renter_headers = make_user('renter')
+    vehicle = make_vehicle(owner)
+    assert request_booking(app.test_client(), renter_headers, vehicle, 10).status_code == 201
+    booking_id = db.bookings.find_one()['_id']
+
+    responses = run_in_parallel(app, [
+        lambda client: client.put(f'/bookings/{booking_id}', headers=owner_headers, json={'status': 'confirmed'})
+    ] * THREADS)
+
+    assert sorted(r.status_code for r in responses) == [200] + [400] * (THREADS - 1)
+    assert db.bookings.find_one({'_id': booking_id})['status'] == 'confirmed'
+    assert db.vehicles.find_one({'_id': vehicle['_id']})['availability'] is False
+
+
+def test_parallel_confirms_on_one_vehicle_claim_it_once(app, db, make_user, make_vehicle):
+    owner, owner_headers = make_user('owner')
+    vehicle = make_vehicle(owner)
+    client = app.test_client()
+    for i in range(THREADS):
+        _, renter_headers = make_user('renter')
+        assert request_booking(client, renter_headers, vehicle, 10 + 2 * i).status_code == 201
+    booking_ids = [b['_id'] for b in db.bookings.find()]
+
+    responses = run_in_parallel(app, [
+        lambda client, booking_id=booking_id: client.put(f'/bookings/{booking_id}', headers=owner_headers,
+                                                          json={'status': 'confirmed'})
+        for booking_id in booking_ids
+    ])
+
+    assert sorted(r.status_code for r in responses) == [200] + [400] * (THREADS - 1)
+    assert db.bookings.count_documents({'status': 'confirmed'}) == 1
+    assert db.bookings.count_documents({'status': 'pending'}) == THREADS - 1
+    assert db.vehicles.find_one({'_id': vehicle['_id']})['availability'] is False
+
+
+def test_overlapping_bookings_keep_one(app, db, make_user, make_vehicle):
+    owner, _ = make_user('owner')
+    vehicle = make_vehicle(owner)
+    renters = [make_user('renter')[1] for _ in range(THREADS)]
+
+    responses = run_in_parallel(app, [
+        lambda client, headers=headers: request_booking(client, headers, vehicle, 10, days=3) for headers in renters
+    ])
+
+    assert sorted(r.status_code for r in responses) == [201] + [409] * (THREADS - 1)
+    assert db.bookings.count_documents({'vehicle_id': vehicle['_id']}) == 1
+
+
+def test_cancel_between_confirm_and_claim_releases_vehicle(app, db, make_user, make_vehicle, monkeypatch):
+    owner, owner_headers = make_user('owner')
+    _, renter_headers = make_user('renter')
+    vehicle = make_vehicle(owner)
+    assert request_booking(app.test_client(), renter_headers, vehicle, 10).status_code == 201
+    booking_id = db.bookings.find_one()['_id']
+    vehicles = api.LazyCollection('vehicles')
+    cancels = []
+
+    class CancelBeforeClaim:
+        """The vehicles collection, except that the renter cancels right before the owner's claim."""
+        def __getattr__(self, attr):
+            return getattr(vehicles, attr)
+
+        def update_one(self, query, update, **kwargs):
+            if not cancels and update.get('$set', {}).get('availability') is False:
+                cancels.append(app.test_client().put(f'/bookings/{booking_id}', headers=renter_headers,
+                                                     json={'status': 'cancelled'}))
+            return vehicles.update_one(query, update, **kwargs)
+
+    monkeypatch.setattr(api, 'vehicles_collection', CancelBeforeClaim())
+    response = app.test_client().put(f'/bookings/{booking_id}', headers=owner_headers, json={'status': 'confirmed'})
+
+    assert cancels[0].status_code == 200
+    assert response.status_code == 409
+    assert db.bookings.find_one({'_id': booking_id})['status'] == 'cancelled'
+    assert db.vehicles.find_one({'_id': vehicle['_id']})['availability'] is True
@@ -0,0 +1,66 @@
+import datetime
+
+import app as api
+
+
+def make_booking(db, renter, vehicle, at):
+    booking = {'renter_id': renter['_id'], 'owner_id': vehicle['owner_id'], 'vehicle_id': vehicle['_id'],
+               'status': 'pending', 'created_at': at, 'updated_at': at}
+    db.bookings.insert_one(booking)
+    return booking
+
+
+def test_renter_bookings_follow_joined_vehicle_writes(app, db, make_user, make_vehicle):
+    owner, _ = make_user('owner')
+    renter, headers = make_user('renter')
+    earlier = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    vehicle = make_vehicle(owner, updated_at=earlier)
+    booking = make_booking(db, renter, vehicle, earlier)
+    client = app.test_client()
+
+    etag = client.get('/bookings', headers=headers).headers['ETag'].strip('"')
+    assert client.get('/bookings', headers={**headers, 'If-None-Match': etag}).status_code == 304
+    since = (earlier + datetime.timedelta(minutes=1)).isoformat()
+    assert client.get(f'/bookings?since={since}', headers=headers).get_json()['items'] == []
+
+    db.vehicles.update_one({'_id': vehicle['_id']},
+                           {'$set': {'rent_price': 1500.0, 'updated_at': datetime.datetime.utcnow()}})
+
+    assert client.get('/bookings', headers={**headers, 'If-None-Match': etag}).status_code == 200
+    items = client.get(f'/bookings?since={since}', headers=headers).get_json()['items']
+    assert [item['_id'] for item in items] == [str(booking['_id'])]
+    assert items[0]['vehicle_details']['rent_price'] == 1500.0
+
+
+def test_since_with_a_utc_offset(app, db, make_user, make_vehicle):
+    owner, owner_headers = make_user('owner')
+    renter, headers = make_user('renter')
+    vehicle = make_vehicle(owner)
+    booking = make_booking(db, renter, vehicle, datetime.datetime.utcnow())
+    since = (datetime.datetime.utcnow() - datetime.timedelta(minutes=5)).isoformat(timespec='milliseconds') + 'Z'
+    client = app.test_client()
+
+    for user_headers in (headers, owner_headers):
+        response = client.get(f'/bookings?since={since}', headers=user_headers)
+        assert response.status_code == 200
+        assert [item['_id'] for item in response.get_json()['items']] == [str(booking['_id'])]
+    response = client.get(f'/vehicles?since={since}', headers=owner_headers)
+    assert [item['_id'] for item in response.get_json()['items']] == [str(vehicle['_id'])]
+
+
+def test_pages_tag_their_body_without_list_queries(app, db, make_user, make_vehicle, monkeypatch):
+    owner, owner_headers = make_user('owner')
+    renter, headers = make_user('renter')
+    vehicle = make_vehicle(owner)
+    make_booking(db, renter, vehicle, datetime.datetime.utcnow())
+
+    def no_list_stats(*args):
+        raise AssertionError('a bounded page must not aggregate the whole list')
+
+    monkeypatch.setattr(api, 'list_stats', no_list_stats)
+    client = app.test_client()
+    for path, user_headers in [('/bookings', headers), ('/bookings', owner_headers), ('/vehicles', owner_headers)]:
+        first = client.get(f'{path}?limit=5', headers=user_headers)
+        assert first.status_code == 200 and len(first.get_json()) == 1
+        etag = first.headers['ETag'].strip('"')
+        assert client.get(f'{path}?limit=5', headers={**user_headers, 'If-None-Match': etag}).status_code == 304
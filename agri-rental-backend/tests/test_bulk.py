@@ -0,0 +1,99 @@
+import datetime
+import json
+
+import mongomock
+from bson import ObjectId
+
+from test_booking_transitions import request_booking
+
+STATS = {'vehicles': 0, 'available_vehicles': 0, 'pending_requests': 0, 'active_rentals': 0,
+         'completed_rentals': 0, 'earnings': 0}
+
+ROW = {'vehicle_name': 'Tractor', 'model': 'M1', 'type': 'tractor', 'rent_price': 900,
+       'location': {'latitude': 17.0, 'longitude': 78.0}}
+
+
+def import_vehicles(app, headers, data, content_type):
+    return app.test_client().post('/vehicles/bulk', headers=headers, data=data, content_type=content_type)
+
+
+def test_bulk_import_accepts_json_ndjson_and_csv(app, db, make_user):
+    owner, headers = make_user('owner')
+    db.owner_stats.insert_one({'_id': owner['_id'], **STATS})
+    ndjson = '\n'.join([json.dumps(ROW), '{not json', json.dumps({**ROW, 'availability': False})]) + '\n'
+    csv_body = 'vehicle_name,model,type,rent_price,latitude,longitude\nSeeder,S1,seeder,400,17.1,78.1\nBad,,,x,,\n'
+
+    responses = [
+        import_vehicles(app, headers, json.dumps([ROW, {**ROW, 'rent_price': 'cheap'}]), 'application/json'),
+        import_vehicles(app, headers, ndjson, 'application/x-ndjson'),
+        import_vehicles(app, headers, csv_body, 'text/csv'),
+    ]
+
+    assert [r.status_code for r in responses] == [201, 201, 201]
+    assert [r.get_json()['inserted'] for r in responses] == [1, 2, 1]
+    assert [[e['row'] for e in r.get_json()['errors']] for r in responses] == [[2], [2], [2]]
+    assert db.vehicles.count_documents({'owner_id': owner['_id']}) == 4
+    seeder = db.vehicles.find_one({'type': 'seeder'})
+    assert seeder['rent_price'] == 400.0 and seeder['geo'] == {'type': 'Point', 'coordinates': [78.1, 17.1]}
+    stats = db.owner_stats.find_one({'_id': owner['_id']})
+    assert (stats['vehicles'], stats['available_vehicles']) == (4, 3)
+
+
+def test_bulk_import_chunks_and_stops_at_the_row_limit(app, db, make_user, monkeypatch):
+    _, headers = make_user('owner')
+    app.config.update(BULK_CHUNK_SIZE=2, BULK_MAX_ROWS=5)
+    batches = []
+    insert_many = mongomock.Collection.insert_many
+
+    def counting_insert_many(self, docs, *args, **kwargs):
+        if self.name == 'vehicles':
+            batches.append(len(docs))
+        return insert_many(self, docs, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock.Collection, 'insert_many', counting_insert_many)
+    response = import_vehicles(app, headers, json.dumps([ROW] * 7), 'application/json')
+
+    body = response.get_json()
+    assert response.status_code == 201 and body['inserted'] == 5
+    assert batches == [2, 2, 1]
+    assert body['errors'] == [{'row': 6, 'message': 'Only 5 vehicles are accepted per request'}]
+
+
+def test_bulk_import_rejects_a_malformed_body(app, make_user):
+    _, headers = make_user('owner')
+    response = import_vehicles(app, headers, '{"vehicles": 3}', 'application/json')
+    assert response.status_code == 400
+    assert response.get_json()['errors'][0]['row'] is None
+
+
+def test_bulk_status_reports_each_booking(app, db, make_user, make_vehicle):
+    owner, owner_headers = make_user('owner')
+    _, renter_headers = make_user('renter')
+    held, free = make_vehicle(owner), make_vehicle(owner)
+    client = app.test_client()
+    for vehicle in (held, free):
+        assert request_booking(client, renter_headers, vehicle, 5).status_code == 201
+    confirmed = db.bookings.find_one({'vehicle_id': held['_id']})
+    pending = db.bookings.find_one({'vehicle_id': free['_id']})
+    assert client.put(f"/bookings/{confirmed['_id']}", headers=owner_headers, json={'status': 'confirmed'}).status_code == 200
+    db.owner_stats.insert_one({'_id': owner['_id'], **STATS, 'pending_requests': 1, 'active_rentals': 1,
+                               'available_vehicles': 1, 'earnings': confirmed['amount']})
+    missing = str(ObjectId())
+
+    response = client.post('/bookings/bulk-status', headers=owner_headers, json={
+        'status': 'cancelled', 'booking_ids': [str(confirmed['_id']), str(pending['_id']), missing, 'nope']})
+
+    body = response.get_json()
+    assert response.status_code == 200 and body['updated'] == 2
+    results = body['results']
+    assert results[str(confirmed['_id'])]['status'] == results[str(pending['_id'])]['status'] == 'ok'
+    assert results[missing] == {'status': 'error', 'message': 'Booking not found'}
+    assert results['nope']['status'] == 'error'
+    assert db.vehicles.find_one({'_id': held['_id']})['availability'] is True
+    stats = db.owner_stats.find_one({'_id': owner['_id']})
+    assert (stats['pending_requests'], stats['active_rentals'], stats['available_vehicles'], stats['earnings']) == (0, 0, 2, 0)
+
+    again = client.post('/bookings/bulk-status', headers=owner_headers, json={
+        'status': 'completed', 'booking_ids': [str(pending['_id'])]}).get_json()
+    assert again['updated'] == 0
+    assert again['results'][str(pending['_id'])]['message'] == 'Cannot move a cancelled booking to completed.'
@@ -0,0 +1,17 @@
+import app as api
+
+
+def test_config_from_env_casts_by_default_type():
+    config = api.config_from_env({
+        'SEARCH_PRICE_BUCKETS': '0, 1000,5000',
+        'PAGE_MAX_LIMIT': '50',
+        'SCHEDULER_ENABLED': 'yes',
+        'MONGO_DB': 'other',
+    })
+    assert config == {'SEARCH_PRICE_BUCKETS': [0, 1000, 5000], 'PAGE_MAX_LIMIT': 50,
+                      'SCHEDULER_ENABLED': True, 'MONGO_DB': 'other'}
+
+
+def test_list_settings_from_env_reach_the_app(monkeypatch):
+    monkeypatch.setenv('SEARCH_PRICE_BUCKETS', '0,800')
+    assert api.create_app({'TESTING': True}).config['SEARCH_PRICE_BUCKETS'] == [0, 800]
@@ -0,0 +1,48 @@
+import app as api
+
+
+def test_streams_beyond_the_cap_get_503(app, make_user):
+    app.config['EVENTS_MAX_STREAMS'] = 1
+    _, headers = make_user('renter')
+    client = app.test_client()
+
+    first = client.get('/events', headers=headers, buffered=False)
+    second = client.get('/events', headers=headers)
+
+    assert first.status_code == 200
+    assert second.status_code == 503 and second.headers['Retry-After']
+    first.close()
+    assert api.event_hub.connections() == 0
+
+
+def test_replay_includes_events_inserted_out_of_seq_order(app, db, make_user, monkeypatch):
+    user, headers = make_user('renter')
+    audience = [f"user:{user['_id']}"]
+    now = api.datetime.datetime.utcnow()
+    # seq 12 was inserted before 11; the client saw 12 before 11 existed. 10 is outside the lookback
+    for seq, seconds in [(10, -60), (12, 1), (11, 2)]:
+        db.events.insert_one({'seq': seq, 'type': 'booking.updated', 'id': str(seq), 'data': {}, 'audience': audience,
+                              'created_at': now + api.datetime.timedelta(seconds=seconds)})
+
+    response = app.test_client().get('/events', headers={**headers, 'Last-Event-ID': '12'}, buffered=False)
+    chunks = iter(response.response)
+    body = next(chunks) + next(chunks)
+    response.close()
+
+    assert b'id: 11\n' in body
+    assert b'id: 10\n' not in body and b'id: 12\n' not in body
+
+
+def test_failed_replay_releases_the_stream(app, make_user, monkeypatch):
+    app.config['EVENTS_MAX_STREAMS'] = 1
+    _, headers = make_user('renter')
+
+    class Broken:
+        def __getattr__(self, attr):
+            raise api.PyMongoError('down')
+
+    monkeypatch.setattr(api, 'events_collection', Broken())
+    client = app.test_client()
+    client.application.testing = False # Let the error become a 500 instead of propagating
+    assert client.get('/events', headers={**headers, 'Last-Event-ID': '5'}).status_code == 500
+    assert api.event_hub.connections() == 0
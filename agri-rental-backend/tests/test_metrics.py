@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+WORKER = '''
+import app as api
+api.request_duration.labels('/vehicles', 'GET', 200).observe(0.01)
+api.events_open_streams.inc()
+'''
+
+
+def test_metrics_endpoint(app, make_user):
+    _, headers = make_user('renter')
+    client = app.test_client()
+    client.get('/vehicles', headers=headers)
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{method="GET",route="/vehicles",status="200"}' in body
+    assert 'user_cache_misses_total' in body
+
+
+def test_metrics_add_up_across_worker_processes(tmp_path):
+    env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': str(tmp_path)}
+    for _ in range(2):
+        subprocess.run([sys.executable, '-c', WORKER], cwd=APP_DIR, env=env, check=True)
+    scrape = subprocess.run([sys.executable, '-c', 'import app; print(app.render_metrics().decode())'],
+                            cwd=APP_DIR, env=env, check=True, capture_output=True, text=True).stdout
+    assert 'http_request_duration_seconds_count{method="GET",route="/vehicles",status="200"} 2.0' in scrape
+    assert 'events_open_streams 2.0' in scrape
@@ -0,0 +1,73 @@
+import datetime
+
+from test_booking_transitions import request_booking
+
+ROW = {'vehicle_name': 'Tractor', 'model': 'M1', 'type': 'tractor', 'rent_price': 1000,
+       'location': {'latitude': 17.0, 'longitude': 78.0}}
+FIELDS = ['vehicles', 'available_vehicles', 'pending_requests', 'active_rentals', 'completed_rentals', 'earnings']
+
+
+def counters(db, owner):
+    stats = db.owner_stats.find_one({'_id': owner['_id']})
+    return {field: stats[field] for field in FIELDS}
+
+
+def test_counters_follow_vehicle_and_booking_changes(app, db, make_user):
+    owner, owner_headers = make_user('owner')
+    _, renter_headers = make_user('renter')
+    client = app.test_client()
+
+    def summary(refresh=False):
+        response = client.get('/owner/summary' + ('?refresh=1' if refresh else ''), headers=owner_headers)
+        assert response.status_code == 200
+        return {field: response.get_json()[field] for field in FIELDS}
+
+    def expect(**values):
+        assert counters(db, owner) == {field: values.get(field, 0) for field in FIELDS}
+
+    def booking_for(vehicle_id, status):
+        return db.bookings.find_one({'vehicle_id': vehicle_id, 'status': status})
+
+    def move(booking, status, headers=owner_headers):
+        assert client.put(f"/bookings/{booking['_id']}", headers=headers, json={'status': status}).status_code == 200
+
+    assert summary() == dict.fromkeys(FIELDS, 0) # First read builds the document
+    for _ in range(2):
+        assert client.post('/vehicles', headers=owner_headers, json=ROW).status_code == 201
+    first, second = db.vehicles.find({'owner_id': owner['_id']}).sort('_id', 1)
+    expect(vehicles=2, available_vehicles=2)
+
+    assert request_booking(client, renter_headers, first, 3, days=2).status_code == 201
+    expect(vehicles=2, available_vehicles=2, pending_requests=1)
+    move(booking_for(first['_id'], 'pending'), 'confirmed')
+    expect(vehicles=2, available_vehicles=1, active_rentals=1, earnings=2000.0)
+    move(booking_for(first['_id'], 'confirmed'), 'completed')
+    expect(vehicles=2, available_vehicles=2, completed_rentals=1, earnings=2000.0)
+
+    assert request_booking(client, renter_headers, second, 3).status_code == 201
+    move(booking_for(second['_id'], 'pending'), 'cancelled', renter_headers)
+    expect(vehicles=2, available_vehicles=2, completed_rentals=1, earnings=2000.0)
+    assert request_booking(client, renter_headers, second, 10).status_code == 201
+    move(booking_for(second['_id'], 'pending'), 'confirmed')
+    expect(vehicles=2, available_vehicles=1, active_rentals=1, completed_rentals=1, earnings=3000.0)
+    move(booking_for(second['_id'], 'confirmed'), 'cancelled')
+    expect(vehicles=2, available_vehicles=2, completed_rentals=1, earnings=2000.0)
+
+    assert client.delete(f"/vehicles/{second['_id']}", headers=owner_headers).status_code == 200
+    expect(vehicles=1, available_vehicles=1, completed_rentals=1, earnings=2000.0)
+    assert summary(refresh=True) == summary() == counters(db, owner)
+
+
+def test_rebuild_counts_archived_bookings(app, db, make_user, make_vehicle):
+    owner, owner_headers = make_user('owner')
+    vehicle = make_vehicle(owner, availability=False)
+    now = datetime.datetime.utcnow()
+    db.bookings.insert_one({'owner_id': owner['_id'], 'vehicle_id': vehicle['_id'], 'status': 'confirmed', 'amount': 500.0})
+    db.bookings.insert_one({'owner_id': owner['_id'], 'vehicle_id': vehicle['_id'], 'status': 'pending', 'amount': 80.0})
+    db.bookings_archive.insert_one({'owner_id': owner['_id'], 'vehicle_id': vehicle['_id'], 'status': 'completed',
+                                    'amount': 250.5, 'archived_at': now})
+
+    body = app.test_client().get('/owner/summary?refresh=1', headers=owner_headers).get_json()
+    assert {field: body[field] for field in FIELDS} == {
+        'vehicles': 1, 'available_vehicles': 0, 'pending_requests': 1,
+        'active_rentals': 1, 'completed_rentals': 1, 'earnings': 750.5}
@@ -0,0 +1,47 @@
+from werkzeug.security import generate_password_hash
+
+import app as api
+
+
+def test_needs_rehash_accepts_short_method_names(app, monkeypatch):
+    monkeypatch.setattr(api, '_hash_prefixes', {})
+    old = generate_password_hash('secret', 'pbkdf2:sha256:1000')
+    for method in ['scrypt', 'pbkdf2']:
+        app.config['PASSWORD_HASH_METHOD'] = method
+        assert not api.needs_rehash(generate_password_hash('secret', method))
+        assert api.needs_rehash(old)
+
+
+def test_killed_pool_child_is_replaced(app):
+    stored = generate_password_hash('secret', 'pbkdf2:sha256:1000')
+    assert api.verify_password(stored, 'secret')
+    pool = api.hash_pool()
+    for process in list(pool._processes.values()):
+        process.kill()
+        process.join()
+
+    assert api.verify_password(stored, 'secret')
+    assert api.hash_pool() is not pool
+
+
+def test_upgrade_waits_for_a_free_slot(app, db, make_user, monkeypatch):
+    app.extensions['agri_rental']['hash_workers'] = api.WorkerPool(1, max_queued=1)
+    user, _ = make_user('renter')
+    submitted = []
+    monkeypatch.setattr(api, 'submit_hash_job', lambda *args: submitted.append(args))
+
+    slots = api.hash_slots()
+    slots.acquire() # A login is hashing
+    api.upgrade_password_hash(user['_id'], user['password'], 'secret')
+    slots.release()
+
+    assert submitted == []
+
+
+def test_apps_keep_their_own_pools(app):
+    other = api.create_app({'TESTING': True, 'PASSWORD_HASH_QUEUE': 3})
+    pool, slots = api.hash_pool(), api.hash_slots()
+    with other.app_context():
+        assert api.hash_slots() is not slots
+        assert api.hash_pool() is not pool
+    assert api.hash_pool() is pool and api.hash_slots() is slots
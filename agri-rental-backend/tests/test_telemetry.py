@@ -0,0 +1,18 @@
+import datetime
+
+
+def test_positions_do_not_touch_vehicle_updated_at(app, db, make_user, make_vehicle):
+    owner, headers = make_user('owner')
+    earlier = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    vehicle = make_vehicle(owner, updated_at=earlier)
+    updated_at = db.vehicles.find_one({'_id': vehicle['_id']})['updated_at']
+    ts = datetime.datetime.utcnow().replace(microsecond=0)
+    response = app.test_client().post('/telemetry', headers=headers, json={'vehicles': [{
+        'vehicle_id': str(vehicle['_id']),
+        'positions': [{'ts': ts.isoformat(), 'latitude': 17.1, 'longitude': 78.2}]
+    }]})
+    assert response.status_code == 201
+
+    stored = db.vehicles.find_one({'_id': vehicle['_id']})
+    assert stored['last_position']['ts'] == ts
+    assert stored['updated_at'] == updated_at
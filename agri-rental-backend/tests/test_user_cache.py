@@ -0,0 +1,25 @@
+import datetime
+
+import jwt
+
+import app as api
+from conftest import SECRET_KEY
+
+
+def test_role_in_token_overrides_a_stale_cached_user(app, make_user):
+    owner, _ = make_user('owner')
+    # Another worker cached the user before the role was set
+    api.user_cache.set(str(owner['_id']), api.to_json({**owner, 'role': None}))
+    token = jwt.encode({'user_id': str(owner['_id']), 'role': 'owner',
+                        'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=1)}, SECRET_KEY, algorithm='HS256')
+
+    response = app.test_client().post('/vehicles', headers={'x-access-token': token}, json={
+        'vehicle_name': 'Tractor', 'model': 'M1', 'type': 'tractor', 'rent_price': 900,
+        'location': {'latitude': 17.0, 'longitude': 78.0}})
+    assert response.status_code == 201
+    assert api.user_cache.get(str(owner['_id']))['role'] == 'owner'
+
+
+def test_profile_is_read_only(app, make_user):
+    _, headers = make_user('renter')
+    assert app.test_client().put('/profile', headers=headers, json={'fullname': 'X'}).status_code == 405
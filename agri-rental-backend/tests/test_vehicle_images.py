@@ -0,0 +1,67 @@
+import io
+import os
+from concurrent.futures import Future
+
+import flask
+import pytest
+
+import app as api
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+@pytest.fixture
+def owner_vehicle(app, make_user, make_vehicle, tmp_path):
+    app.config['IMAGE_LOCAL_DIR'] = str(tmp_path)
+    owner, headers = make_user('owner')
+    return make_vehicle(owner), headers
+
+
+def test_oversized_upload_is_413(app, owner_vehicle):
+    vehicle, headers = owner_vehicle
+    app.config['IMAGE_MAX_BYTES'] = 16
+    response = app.test_client().post(f"/vehicles/{vehicle['_id']}/images/image1", headers=headers, data=PNG)
+    assert response.status_code == 413
+
+
+def test_failed_submit_cleans_up(app, db, owner_vehicle, monkeypatch):
+    vehicle, headers = owner_vehicle
+    submitted = []
+
+    def refuse(fn, path, *args):
+        submitted.append(path)
+        raise RuntimeError('cannot start workers')
+
+    monkeypatch.setattr(api, 'submit_image_job', refuse)
+    app.testing = False # Let the error become a 500 instead of propagating
+    response = app.test_client().post(f"/vehicles/{vehicle['_id']}/images/image1", headers=headers, data=PNG)
+
+    assert response.status_code == 500
+    assert not os.path.exists(submitted[0])
+    assert db.vehicles.find_one({'_id': vehicle['_id']})['images']['image1']['status'] == 'failed'
+
+
+def test_oversized_multipart_is_refused_before_parsing(app, owner_vehicle, monkeypatch):
+    vehicle, headers = owner_vehicle
+    app.config['IMAGE_MAX_BYTES'] = 16
+    parsed = []
+    monkeypatch.setattr(flask.Request, '_load_form_data', lambda self: parsed.append(True))
+    body = PNG + b'\x00' * api.UPLOAD_FORM_OVERHEAD
+    response = app.test_client().post(f"/vehicles/{vehicle['_id']}/images/image1", headers=headers,
+                                      data={'file': (io.BytesIO(body), 'big.png')})
+    assert response.status_code == 413
+    assert not parsed
+
+
+def test_failed_render_invalidates_caches(app, db, owner_vehicle, monkeypatch):
+    vehicle, headers = owner_vehicle
+    failed = Future()
+    failed.set_exception(RuntimeError('corrupt image'))
+    statuses = []
+    monkeypatch.setattr(api, 'submit_image_job', lambda *args: failed)
+    monkeypatch.setattr(api, 'invalidate_vehicle_caches', lambda obj_id: statuses.append(
+        db.vehicles.find_one({'_id': obj_id})['images']['image1']['status']))
+    response = app.test_client().post(f"/vehicles/{vehicle['_id']}/images/image1", headers=headers, data=PNG)
+
+    assert response.status_code == 202
+    assert statuses == ['processing', 'failed']
@@ -0,0 +1,44 @@
+import app as api
+
+
+def test_full_renter_catalogue_is_streamed_uncached(app, make_user, make_vehicle):
+    owner, _ = make_user('owner')
+    _, renter_headers = make_user('renter')
+    for _ in range(5):
+        make_vehicle(owner)
+
+    response = app.test_client().get('/vehicles', headers=renter_headers)
+
+    assert response.status_code == 200
+    assert len(response.json) == 5
+    assert api.vehicle_cache.stats()['size'] == 0
+
+
+def test_equivalent_field_lists_share_a_cached_page(app, make_user, make_vehicle):
+    owner, _ = make_user('owner')
+    _, renter_headers = make_user('renter')
+    for _ in range(3):
+        make_vehicle(owner)
+    client = app.test_client()
+
+    first = client.get('/vehicles?limit=2&fields=vehicle_name,model', headers=renter_headers)
+    second = client.get('/vehicles?limit=2&fields=model,vehicle_name', headers=renter_headers)
+
+    assert first.json == second.json
+    assert len(first.json) == 2 and 'X-Next-Cursor' in first.headers
+    assert api.vehicle_cache.stats()['size'] == 1
+
+
+def test_fields_outside_the_whitelist_are_rejected(app, make_user, make_vehicle):
+    owner, _ = make_user('owner')
+    make_vehicle(owner)
+    _, headers = make_user('renter')
+    client = app.test_client()
+
+    for path in ['/vehicles', '/vehicles/search', '/bookings']:
+        response = client.get(f'{path}?fields=vehicle_name,owner.password', headers=headers)
+        assert response.status_code == 400
+        assert 'owner.password' in response.get_json()['message']
+    assert client.get('/vehicles?fields=geo', headers=headers).status_code == 400
+    assert client.get('/vehicles?fields=vehicle_name,location.latitude', headers=headers).status_code == 200
+    assert client.get('/bookings?fields=status,vehicle_details.vehicle_name', headers=headers).status_code == 200
@@ -0,0 +1,11 @@
+"""
+Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting in app.DEFAULT_CONFIG can be overridden through an environment
+variable of the same name (MONGO_URI, MONGO_MAX_POOL_SIZE, SECRET_KEY, ...).
+"""
+from app import create_app
+
+app = create_app()